@@ -1,19 +1,31 @@
-import socket
+import os
+import sys
 import requests
 import subprocess
 import json
 from urllib.parse import urlparse
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.dnscache import DnsCache
+from common.whoiscache import WhoisCache
+
+dns_cache = DnsCache.shared()
+whois_cache = WhoisCache()
+
 def extract_domain(url):
     parsed_url = urlparse(url)
     return parsed_url.netloc if parsed_url.netloc else parsed_url.path
 
 def get_ip(domain):
     try:
-        return socket.gethostbyname(domain)
+        answers = dns_cache.resolve(domain, 'A')['answers']
     except Exception as e:
         print(f"[!] Error resolving domain to IP: {e}")
         return None
+    if not answers:
+        print(f"[!] Error resolving domain to IP: no A record for {domain}")
+        return None
+    return answers[0]
 
 def get_asn(ip):
     try:
@@ -28,7 +40,7 @@ def get_asn(ip):
         print(f"[!] Error getting ASN: {e}")
         return None
 
-def whois_asn(asn):
+def fetch_whois_asn(asn):
     try:
         result = subprocess.check_output(["whois", asn], universal_newlines=True)
         return result
@@ -36,6 +48,9 @@ def whois_asn(asn):
         print(f"[!] Error running whois: {e}")
         return None
 
+def whois_asn(asn):
+    return whois_cache.lookup(asn, fetch_whois_asn)
+
 def parse_whois_output(output):
     parsed = {}
     if not output:
@@ -0,0 +1,266 @@
+"""
+Shared DNS answer cache with TTL-aware and negative caching.
+
+Answers are kept in memory per (name, rdtype) until the record TTL runs out
+(clamped to min_ttl..max_ttl). NXDOMAIN and empty answers are cached too,
+for the zone's SOA minimum, so names that do not exist are not asked about
+again. With a path, positive answers are loaded from and saved to a JSON file
+so every module and every run shares them. The resolved addresses can be
+exported as a hosts file or a JSON map for httpx, naabu and nmap.
+
+Usage:
+  from common.dnscache import DnsCache
+  dns_cache = DnsCache.shared()
+  entry = dns_cache.resolve('www.example.com', 'A')
+  entry = await dns_cache.aresolve('www.example.com', 'AAAA', query=pool.resolve)
+  dns_cache.write_hosts('hosts.txt')
+
+Export from the command line:
+  python3 -m common.dnscache --hosts hosts.txt --json resolved.json
+"""
+import argparse
+import asyncio
+import atexit
+import json
+import os
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+import dns.asyncresolver
+import dns.exception
+import dns.rcode
+import dns.rdatatype
+import dns.resolver
+
+CACHE_FILE = os.path.join(os.environ.get('RECON_CACHE_DIR', os.path.expanduser('~/.cache/recon-engine')),
+                          'dns.json')
+MIN_TTL = 30
+MAX_TTL = 24 * 3600
+NEGATIVE_TTL = 300
+# Brute force produces millions of misses; only the most recent are kept
+MAX_NEGATIVE = 100000
+
+_shared = None
+_shared_guard = threading.Lock()
+
+
+def normalize(name):
+    return name.strip().rstrip('.').lower()
+
+
+def resolver_query(resolver=None, lifetime=None):
+    """Wrap a dnspython async resolver as a query(name, rdtype) -> response callable."""
+    async def query(name, rdtype):
+        active = resolver or dns.asyncresolver.get_default_resolver()
+        answer = await active.resolve(name, rdtype, raise_on_no_answer=False, lifetime=lifetime)
+        return answer.response
+    return query
+
+
+def negative_ttl(response, default=NEGATIVE_TTL):
+    # RFC 2308: negative answers live for min(SOA TTL, SOA MINIMUM)
+    for rrset in response.authority:
+        if rrset.rdtype == dns.rdatatype.SOA:
+            return min(rrset.ttl, rrset[0].minimum)
+    return default
+
+
+class DnsCache:
+    def __init__(self, path=None, min_ttl=MIN_TTL, max_ttl=MAX_TTL, negative_ttl=NEGATIVE_TTL,
+                 max_negative=MAX_NEGATIVE):
+        self.path = path
+        self.min_ttl = min_ttl
+        self.max_ttl = max_ttl
+        self.negative_ttl = negative_ttl
+        self.max_negative = max_negative
+        self.entries = {}
+        # Negative keys in insertion order, so the oldest is evicted in O(1)
+        self.negatives = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._guard = threading.Lock()
+        self._locks = {}
+        # In-flight lookups are tied to the event loop that started them
+        self._inflight = weakref.WeakKeyDictionary()
+        if path:
+            self.load()
+
+    @classmethod
+    def shared(cls):
+        """Process-wide cache, persisted to RECON_DNS_CACHE (empty for memory only)."""
+        global _shared
+        with _shared_guard:
+            if _shared is None:
+                path = os.environ.get('RECON_DNS_CACHE', CACHE_FILE) or None
+                _shared = cls(path)
+                if path:
+                    atexit.register(_shared.save)
+            return _shared
+
+    def get(self, name, rdtype='A'):
+        key = (normalize(name), rdtype.upper())
+        entry = self.entries.get(key)
+        if entry is None or entry['expires'] < time.time():
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry
+
+    def put(self, name, rdtype, answers, ttl, rcode='NOERROR', cnames=()):
+        negative = rcode != 'NOERROR' or not answers
+        ttl = max(self.min_ttl, min(ttl, self.negative_ttl if negative else self.max_ttl))
+        entry = {'name': normalize(name), 'rdtype': rdtype.upper(), 'rcode': rcode,
+                 'answers': list(answers), 'cnames': list(cnames), 'expires': time.time() + ttl}
+        with self._guard:
+            key = (entry['name'], entry['rdtype'])
+            self.negatives.pop(key, None)
+            if negative:
+                self.negatives[key] = None
+                while len(self.negatives) > self.max_negative:
+                    oldest, _ = self.negatives.popitem(last=False)
+                    self.entries.pop(oldest, None)
+            self.entries[key] = entry
+        return entry
+
+    def store_response(self, name, rdtype, response):
+        """Cache a dns.message response for (name, rdtype) and return the entry."""
+        rcode = dns.rcode.to_text(response.rcode())
+        wanted = dns.rdatatype.from_text(rdtype)
+        answers, cnames, ttls = [], [], []
+        for rrset in response.answer:
+            if rrset.rdtype == wanted:
+                answers.extend(rdata.to_text() for rdata in rrset)
+                ttls.append(rrset.ttl)
+            elif rrset.rdtype == dns.rdatatype.CNAME:
+                cnames.extend(rdata.target.to_text().rstrip('.') for rdata in rrset)
+                ttls.append(rrset.ttl)
+        if answers:
+            ttl = min(ttls)
+        else:
+            ttl = negative_ttl(response, self.negative_ttl)
+        return self.put(name, rdtype, answers, ttl, rcode=rcode, cnames=cnames)
+
+    def _lock(self, key):
+        with self._guard:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def resolve(self, name, rdtype='A', resolver=None):
+        """Blocking lookup through the cache.
+
+        Returns the cache entry; lookup failures such as timeouts raise and
+        are not cached.
+        """
+        key = (normalize(name), rdtype.upper())
+        with self._lock(key):
+            entry = self.get(name, rdtype)
+            if entry is not None:
+                return entry
+            active = resolver or dns.resolver.get_default_resolver()
+            try:
+                answer = active.resolve(name, rdtype, raise_on_no_answer=False)
+            except dns.resolver.NXDOMAIN:
+                return self.put(name, rdtype, [], self.negative_ttl, rcode='NXDOMAIN')
+            return self.store_response(name, rdtype, answer.response)
+
+    async def aresolve(self, name, rdtype='A', query=None):
+        """Asyncio lookup through the cache.
+
+        query(name, rdtype) must return a dns.message response and defaults
+        to the system resolver. Concurrent lookups of the same name share one
+        query. Failures raise and are not cached.
+        """
+        entry = self.get(name, rdtype)
+        if entry is not None:
+            return entry
+        key = (normalize(name), rdtype.upper())
+        inflight = self._inflight.setdefault(asyncio.get_running_loop(), {})
+        if key not in inflight:
+            def finished(future):
+                inflight.pop(key, None)
+                # Waiters may all have been cancelled; mark the error as seen
+                if not future.cancelled():
+                    future.exception()
+            inflight[key] = asyncio.ensure_future(self._fetch(name, rdtype, query or resolver_query()))
+            inflight[key].add_done_callback(finished)
+        return await asyncio.shield(inflight[key])
+
+    async def _fetch(self, name, rdtype, query):
+        try:
+            response = await query(name, rdtype)
+        except dns.resolver.NXDOMAIN:
+            return self.put(name, rdtype, [], self.negative_ttl, rcode='NXDOMAIN')
+        return self.store_response(name, rdtype, response)
+
+    def resolution_map(self):
+        """Return {name: [addresses]} for every unexpired A/AAAA answer."""
+        now = time.time()
+        resolved = {}
+        for (name, rdtype), entry in list(self.entries.items()):
+            if rdtype in ('A', 'AAAA') and entry['answers'] and entry['expires'] >= now:
+                resolved.setdefault(name, []).extend(entry['answers'])
+        return resolved
+
+    def write_hosts(self, path):
+        with open(path, 'w') as f:
+            for name, addresses in sorted(self.resolution_map().items()):
+                for address in addresses:
+                    f.write(f'{address}\t{name}\n')
+
+    def write_json(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.resolution_map(), f, indent=4, sort_keys=True)
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            return
+        now = time.time()
+        for entry in stored:
+            if entry.get('expires', 0) >= now:
+                self.entries.setdefault((entry['name'], entry['rdtype']), entry)
+
+    def save(self):
+        # Only positive answers are persisted; negatives are too many and too short-lived
+        if not self.path:
+            return
+        now = time.time()
+        merged = {(entry['name'], entry['rdtype']): entry for entry in self._stored() if entry['expires'] >= now}
+        merged.update({key: entry for key, entry in list(self.entries.items())
+                       if entry['answers'] and entry['expires'] >= now})
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump(list(merged.values()), f)
+        os.replace(tmp, self.path)
+
+    def _stored(self):
+        # Another module may have saved since we loaded; keep its answers
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return []
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export the shared DNS cache for external tools')
+    parser.add_argument('--cache', default=os.environ.get('RECON_DNS_CACHE', CACHE_FILE),
+                        help='Cache file to read')
+    parser.add_argument('--hosts', help='Write a hosts-file style map (IP<TAB>name)')
+    parser.add_argument('--json', help='Write a JSON {name: [addresses]} map')
+    args = parser.parse_args()
+    cache = DnsCache(args.cache)
+    if args.hosts:
+        cache.write_hosts(args.hosts)
+    if args.json:
+        cache.write_json(args.json)
+    if not args.hosts and not args.json:
+        print(json.dumps(cache.resolution_map(), indent=4, sort_keys=True))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,180 @@
+"""
+Altdns-style permutations of already-found subdomains.
+
+Candidates are streamed lazily in rough order of likelihood: numeric
+increments of existing labels first (api2 -> api3), then environment swaps
+(dev-api -> staging-api), numeric suffixes, environment and word affixes
+(dev-api, api-dev, devapi), and finally new labels above known names
+(dev.api). Everything already known or already tried is skipped with a
+Bloom filter that grows with the wordlist, so memory stays small however
+many candidates are generated and the false-positive rate stays bounded
+however many words were tried first.
+
+Names are relative to the apex (api.eu for api.eu.example.com).
+
+Usage:
+  from common.permute import ScalableBloomFilter, permutations, load_environments
+  tried = ScalableBloomFilter()
+  for label in permutations(['api1', 'dev-portal'], environments=load_environments(), seen=tried):
+      ...
+"""
+import hashlib
+import math
+import os
+import re
+
+CONFIG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'cloud-recon', 'config', 'config.yaml')
+# Common words around hostnames, roughly most productive first
+PERMUTATION_WORDS = ['api', 'admin', 'internal', 'int', 'qa', 'uat', 'stg', 'preprod', 'sandbox', 'beta',
+                     'demo', 'old', 'new', 'v1', 'v2', 'app', 'web', 'portal', 'corp', 'backup', 'mgmt',
+                     'vpn', 'mail', 'static', 'cdn', 'db', 'auth', 'sso', 'dashboard', 'console']
+DEFAULT_ENVIRONMENTS = ['test', 'dev', 'prod', 'stage', 'staging', 'bak']
+
+
+class BloomFilter:
+    def __init__(self, capacity=1000000, error_rate=0.001):
+        self.capacity = capacity
+        self.count = 0
+        self.error_rate = error_rate
+        self.size = max(64, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item):
+        # Double hashing: k positions from two 64-bit halves of one digest
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def add(self, item):
+        self.count += 1
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class ScalableBloomFilter:
+    """Bloom filter that adds a larger, stricter slice each time the current one fills.
+
+    The slices' error rates form a geometric series, so the overall
+    false-positive rate stays below error_rate however many items are added
+    (Almeida et al., "Scalable Bloom Filters").
+    """
+    def __init__(self, initial_capacity=100000, error_rate=0.001, growth=4, tightening=0.5):
+        self.growth = growth
+        self.tightening = tightening
+        self.filters = [BloomFilter(initial_capacity, error_rate * (1 - tightening))]
+
+    def add(self, item):
+        current = self.filters[-1]
+        if current.count >= current.capacity:
+            current = BloomFilter(current.capacity * self.growth, current.error_rate * self.tightening)
+            self.filters.append(current)
+        current.add(item)
+
+    def __contains__(self, item):
+        return any(item in bloom for bloom in self.filters)
+
+
+def remember(names, seen):
+    """Pass names through unchanged, adding each to seen as it is consumed."""
+    for name in names:
+        seen.add(name.lower())
+        yield name
+
+
+def load_environments(path=CONFIG_FILE):
+    # The config is read by cloudbrute too; only the flow list on the
+    # environments line is needed, so no YAML parser is pulled in
+    try:
+        with open(path) as f:
+            for line in f:
+                if line.startswith('environments:'):
+                    values = re.findall(r'["\']([^"\']+)["\']', line.split('#', 1)[0])
+                    return values or DEFAULT_ENVIRONMENTS
+    except OSError:
+        pass
+    return DEFAULT_ENVIRONMENTS
+
+
+def numbered(first, environments):
+    # api01 -> api02, api00; keep zero padding
+    for match in re.finditer(r'\d+', first):
+        number = int(match.group())
+        for step in (1, -1, 2, 3):
+            if number + step < 0:
+                continue
+            digits = str(number + step).zfill(len(match.group()))
+            yield first[:match.start()] + digits + first[match.end():]
+
+
+def swapped(first, environments):
+    # dev-api -> staging-api, prod-api, ...
+    tokens = re.split(r'([-_])', first)
+    for index, token in enumerate(tokens):
+        if token in environments:
+            for environment in environments:
+                if environment != token:
+                    yield ''.join(tokens[:index] + [environment] + tokens[index + 1:])
+
+
+def appended(first, environments):
+    if not re.search(r'\d', first):
+        for number in (1, 2, 3, '01', '02'):
+            yield f'{first}{number}'
+            yield f'{first}-{number}'
+
+
+def dashed(first, word):
+    if word in re.split(r'[-_]', first):
+        return
+    yield f'{word}-{first}'
+    yield f'{first}-{word}'
+
+
+def joined(first, word):
+    if word in re.split(r'[-_]', first):
+        return
+    yield f'{word}{first}'
+    yield f'{first}{word}'
+
+
+def nested(first, word):
+    # The suffix is added by the caller, so this puts word above the whole name
+    yield f'{word}.{first}'
+
+
+def permutations(known, words=PERMUTATION_WORDS, environments=None, seen=None):
+    """Yield new names derived from known, most likely first.
+
+    known is a list of names relative to the apex. seen is a Bloom filter of
+    names already tried; it is updated as candidates are yielded.
+    """
+    environments = list(dict.fromkeys(environments or DEFAULT_ENVIRONMENTS))
+    # Environment names are the most productive words, so they go first
+    words = list(dict.fromkeys([*environments, *words]))
+    seen = seen if seen is not None else ScalableBloomFilter()
+    known = list(dict.fromkeys(name.strip('.').lower() for name in known if name.strip('.')))
+    for name in known:
+        seen.add(name)
+    split = [(first, f'.{rest}' if rest else '') for first, _, rest in (name.partition('.') for name in known)]
+
+    def fresh(candidates, suffix):
+        for candidate in candidates:
+            candidate += suffix
+            if candidate not in seen:
+                seen.add(candidate)
+                yield candidate
+
+    # Edits of a single name first, then each word across every name before
+    # moving on to the next, less likely word
+    for tier in (numbered, swapped, appended):
+        for first, suffix in split:
+            yield from fresh(tier(first, environments), suffix)
+    for tier in (dashed, joined, nested):
+        for word in words:
+            for first, suffix in split:
+                yield from fresh(tier(first, word), suffix)
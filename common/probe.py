@@ -0,0 +1,173 @@
+"""
+In-process asyncio HTTP liveness prober.
+
+Produces the same per-URL record that sub-alive.py builds from httpx JSON
+lines (status_code, tls_version, content_length, title, server, cdn), so it
+can be used in place of shelling out to the ./httpx binary.
+
+Usage:
+  from common.probe import probe_urls
+  results = probe_urls(['https://example.com'], concurrency=200, per_host=4)
+"""
+import asyncio
+import html
+import re
+import ssl
+from concurrent.futures import ThreadPoolExecutor
+
+import aiohttp
+
+USER_AGENT = 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36'
+TITLE_RE = re.compile(rb'<title[^>]*>(.*?)</title>', re.IGNORECASE | re.DOTALL)
+
+# Response headers that identify the CDN in front of a host
+CDN_HEADERS = {
+    'cf-ray': 'cloudflare',
+    'x-amz-cf-id': 'cloudfront',
+    'x-akamai-transformed': 'akamai',
+    'x-akamai-request-id': 'akamai',
+    'x-fastly-request-id': 'fastly',
+    'x-azure-ref': 'azure',
+    'x-msedge-ref': 'azure',
+    'x-sucuri-id': 'sucuri',
+    'x-iinfo': 'incapsula',
+    'x-cdn': 'incapsula',
+    'x-goog-generation': 'google',
+}
+CDN_SERVERS = {
+    'cloudflare': 'cloudflare',
+    'akamaighost': 'akamai',
+    'cloudfront': 'cloudfront',
+    'gws': 'google',
+    'sucuri': 'sucuri',
+}
+
+
+def empty_record(url):
+    return {
+        'url': url,
+        'status_code': None,
+        'tls_version': None,
+        'content_length': None,
+        'title': None,
+        'server': None,
+        'cdn': None
+    }
+
+
+def tls_version_name(version):
+    # ssl reports 'TLSv1.3'; httpx reports 'tls13'
+    if not version:
+        return None
+    return version.lower().replace('v', '').replace('.', '')
+
+
+def detect_cdn(headers):
+    for header, name in CDN_HEADERS.items():
+        if header in headers:
+            return name
+    server = headers.get('server', '').lower()
+    for marker, name in CDN_SERVERS.items():
+        if marker in server:
+            return name
+    return None
+
+
+def extract_title(body, charset):
+    match = TITLE_RE.search(body)
+    if not match:
+        return None
+    try:
+        title = match.group(1).decode(charset or 'utf-8', errors='replace')
+    except LookupError:
+        # The charset comes from the server's Content-Type and may be bogus
+        title = match.group(1).decode('utf-8', errors='replace')
+    return html.unescape(' '.join(title.split())) or None
+
+
+async def probe_url(session, url, timeout=10, retries=1, read_limit=65536):
+    record = empty_record(url)
+    for attempt in range(retries + 1):
+        try:
+            async with session.get(url, timeout=aiohttp.ClientTimeout(total=timeout)) as resp:
+                ssl_object = None
+                if resp.connection is not None and resp.connection.transport is not None:
+                    ssl_object = resp.connection.transport.get_extra_info('ssl_object')
+                body = await resp.content.read(read_limit)
+                record['status_code'] = resp.status
+                record['tls_version'] = tls_version_name(ssl_object.version()) if ssl_object else None
+                record['content_length'] = resp.content_length if resp.content_length is not None else len(body)
+                record['title'] = extract_title(body, resp.charset)
+                record['server'] = resp.headers.get('Server')
+                record['cdn'] = detect_cdn(resp.headers)
+                record['final_url'] = str(resp.url)
+                return record
+        except (aiohttp.ClientError, asyncio.TimeoutError, ssl.SSLError, OSError, ValueError):
+            if attempt == retries:
+                return record
+    return record
+
+
+async def acquire_slot(slots, gate, waiter):
+    # slots is a threading semaphore shared with probes running in other
+    # threads. Only one coroutine per event loop blocks on it, in the waiter
+    # thread; the rest queue on gate instead of polling.
+    async with gate:
+        if slots.acquire(blocking=False):
+            return
+        future = asyncio.get_running_loop().run_in_executor(waiter, slots.acquire)
+        try:
+            await asyncio.shield(future)
+        except asyncio.CancelledError:
+            # The thread still takes the slot; give it back once it does
+            future.add_done_callback(lambda done: done.cancelled() or slots.release())
+            raise
+
+
+async def probe_all(urls, on_record=None, concurrency=200, per_host=4, timeout=10, retries=1, dns_ttl=300,
+                    slots=None):
+    ssl_context = ssl.create_default_context()
+    ssl_context.check_hostname = False
+    ssl_context.verify_mode = ssl.CERT_NONE
+    # limit bounds sockets across all hosts, limit_per_host stops one host from
+    # soaking up the pool; resolved addresses are cached for dns_ttl seconds.
+    connector = aiohttp.TCPConnector(limit=concurrency, limit_per_host=per_host, ttl_dns_cache=dns_ttl,
+                                     ssl=ssl_context)
+    results = {}
+    # Bounded queue so a 100k URL list is never turned into 100k pending tasks
+    queue = asyncio.Queue(maxsize=concurrency * 2)
+    gate = asyncio.Lock()
+    waiter = ThreadPoolExecutor(max_workers=1) if slots else None
+
+    async with aiohttp.ClientSession(connector=connector, headers={'User-Agent': USER_AGENT}) as session:
+        async def worker():
+            while True:
+                url = await queue.get()
+                if url is None:
+                    return
+                if slots:
+                    await acquire_slot(slots, gate, waiter)
+                try:
+                    record = await probe_url(session, url, timeout=timeout, retries=retries)
+                finally:
+                    if slots:
+                        slots.release()
+                results[url] = record
+                if on_record:
+                    on_record(record)
+
+        workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+        try:
+            for url in urls:
+                await queue.put(url)
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+        finally:
+            if waiter:
+                waiter.shutdown(wait=False)
+    return results
+
+
+def probe_urls(urls, on_record=None, **kwargs):
+    return asyncio.run(probe_all(urls, on_record=on_record, **kwargs))
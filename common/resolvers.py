@@ -0,0 +1,225 @@
+"""
+Health-scored pool of DNS resolvers for bulk asyncio lookups.
+
+Every query records latency, timeouts and errors against the resolver that
+served it. Queries go to the better of two randomly picked healthy resolvers,
+and resolvers that keep timing out or that answer for names trusted resolvers
+say do not exist are dropped from rotation mid-run. Answers are only
+spot-checked against the trusted resolvers, at a capped rate, so a wildcard
+zone cannot turn a brute force into a flood of trusted lookups.
+
+Usage:
+  from common.resolvers import ResolverPool
+  pool = ResolverPool.from_file('resolvers.txt')
+  await pool.check_canaries()
+  response, nameserver = await pool.query('www.example.com', 'A')
+"""
+import asyncio
+import random
+import time
+import uuid
+from pathlib import Path
+
+import dns.asyncquery
+import dns.exception
+import dns.message
+import dns.rcode
+import dns.rdatatype
+import dns.resolver
+
+TRUSTED_RESOLVERS = ['1.1.1.1', '8.8.8.8', '9.9.9.9']
+# Has no wildcard record, so random labels under it must be NXDOMAIN
+CANARY_DOMAIN = 'example.com'
+
+
+def read_resolver_file(path):
+    return [line.strip() for line in Path(path).read_text().splitlines()
+            if line.strip() and not line.startswith('#')]
+
+
+class ResolverPool:
+    def __init__(self, servers, trusted=None, timeout=2.0, retries=2, min_samples=20,
+                 max_failure_rate=0.5, max_wrong=2, confirm_first=5, confirm_rate=0.01, trusted_rate=50):
+        self.servers = list(dict.fromkeys(servers))
+        # trusted is None when the servers themselves are trusted (system resolver)
+        self.trusted = trusted
+        self.timeout = timeout
+        self.retries = retries
+        self.min_samples = min_samples
+        self.max_failure_rate = max_failure_rate
+        self.max_wrong = max_wrong
+        # Each resolver's first confirm_first positive answers are checked,
+        # then a confirm_rate sample, with at most trusted_rate checks a second
+        self.confirm_first = confirm_first
+        self.confirm_rate = confirm_rate
+        self.trusted_rate = trusted_rate
+        self._trusted_next = 0.0
+        self.stats = {ns: {'sent': 0, 'ok': 0, 'timeouts': 0, 'errors': 0, 'wrong': 0, 'checked': 0,
+                           'latency': None, 'disabled': False} for ns in self.servers}
+
+    @classmethod
+    def from_file(cls, path, trusted=None, **kwargs):
+        servers = read_resolver_file(path)
+        if not servers:
+            raise ValueError(f'no resolvers listed in {path}')
+        return cls(servers, trusted=trusted or TRUSTED_RESOLVERS, **kwargs)
+
+    @classmethod
+    def system(cls, **kwargs):
+        return cls(dns.resolver.get_default_resolver().nameservers, trusted=None, **kwargs)
+
+    def healthy(self):
+        return [ns for ns in self.servers if not self.stats[ns]['disabled']]
+
+    def score(self, nameserver):
+        stat = self.stats[nameserver]
+        success = (stat['ok'] + 1) / (stat['sent'] + 2)
+        latency = stat['latency'] if stat['latency'] is not None else self.timeout / 4
+        return success / (latency + 0.05)
+
+    def pick(self, exclude=()):
+        candidates = [ns for ns in self.healthy() if ns not in exclude] or self.healthy()
+        if len(candidates) < 2:
+            return candidates[0]
+        first, second = random.sample(candidates, 2)
+        return first if self.score(first) >= self.score(second) else second
+
+    def record(self, nameserver, outcome, latency=None):
+        stat = self.stats[nameserver]
+        if outcome == 'wrong':
+            stat['wrong'] += 1
+        else:
+            stat['sent'] += 1
+            if outcome == 'ok':
+                stat['ok'] += 1
+                stat['latency'] = latency if stat['latency'] is None else 0.8 * stat['latency'] + 0.2 * latency
+            elif outcome == 'timeout':
+                stat['timeouts'] += 1
+            else:
+                stat['errors'] += 1
+
+        failures = stat['timeouts'] + stat['errors']
+        unhealthy = stat['wrong'] >= self.max_wrong or (
+            stat['sent'] >= self.min_samples and failures / stat['sent'] > self.max_failure_rate)
+        # Never take the last healthy resolver out of rotation
+        if unhealthy and not stat['disabled'] and len(self.healthy()) > 1:
+            stat['disabled'] = True
+
+    async def query(self, name, rdtype='A'):
+        """Send one query, retrying elsewhere on timeout or SERVFAIL/REFUSED.
+
+        Returns (response, nameserver) for NOERROR or NXDOMAIN answers and
+        (None, None) when every attempt failed.
+        """
+        response, nameserver, _ = await self._attempt(name, rdtype)
+        return response, nameserver
+
+    async def _attempt(self, name, rdtype):
+        # (response, nameserver, answered); answered is False when no resolver
+        # replied at all, as opposed to replying SERVFAIL/REFUSED
+        tried = set()
+        answered = False
+        for attempt in range(self.retries + 1):
+            nameserver = self.pick(exclude=tried)
+            tried.add(nameserver)
+            query = dns.message.make_query(name, rdtype)
+            start = time.monotonic()
+            try:
+                response, _ = await dns.asyncquery.udp_with_fallback(query, nameserver, timeout=self.timeout)
+            except dns.exception.Timeout:
+                self.record(nameserver, 'timeout')
+                continue
+            except (dns.exception.DNSException, OSError):
+                self.record(nameserver, 'error')
+                continue
+            answered = True
+            if response.rcode() in (dns.rcode.NOERROR, dns.rcode.NXDOMAIN):
+                self.record(nameserver, 'ok', time.monotonic() - start)
+                return response, nameserver, True
+            self.record(nameserver, 'error')
+        return None, None, answered
+
+    async def resolve(self, name, rdtype='A'):
+        """query() that only returns trusted answers, for use with DnsCache.aresolve.
+
+        Raises Timeout when no resolver replied, NoNameservers when they
+        replied SERVFAIL/REFUSED, and NXDOMAIN when a positive answer is
+        contradicted by a trusted resolver.
+        """
+        response, nameserver, answered = await self._attempt(name, rdtype)
+        if response is None:
+            if not answered:
+                raise dns.exception.Timeout()
+            raise dns.resolver.NoNameservers()
+        wanted = dns.rdatatype.from_text(rdtype)
+        if (response.rcode() == dns.rcode.NOERROR and any(rrset.rdtype == wanted for rrset in response.answer)
+                and not await self.confirm(name, nameserver, rdtype)):
+            raise dns.resolver.NXDOMAIN()
+        return response
+
+    async def trusted_rcode(self, name, rdtype='A'):
+        for nameserver in random.sample(self.trusted, len(self.trusted)):
+            try:
+                response = await dns.asyncquery.udp(dns.message.make_query(name, rdtype), nameserver,
+                                                    timeout=self.timeout)
+                return response.rcode()
+            except (dns.exception.DNSException, OSError):
+                continue
+        return None
+
+    async def throttle(self, wait=True):
+        # Reserve the next trusted-lookup slot; False if none is free and wait is False
+        now = time.monotonic()
+        slot = max(now, self._trusted_next)
+        if slot > now and not wait:
+            return False
+        self._trusted_next = slot + 1 / self.trusted_rate
+        await asyncio.sleep(slot - now)
+        return True
+
+    async def confirm(self, name, nameserver, rdtype='A'):
+        """Spot-check a positive answer with a trusted resolver; a lie counts against nameserver.
+
+        Answers that are not sampled, or that find the trusted rate used up
+        once nameserver is past its first checks, are accepted unchecked.
+        """
+        if not self.trusted:
+            return True
+        stat = self.stats[nameserver]
+        vetting = stat['checked'] < self.confirm_first
+        if not vetting and random.random() >= self.confirm_rate:
+            return True
+        # Counted before waiting, so concurrent answers do not all vet one resolver
+        stat['checked'] += 1
+        if not await self.throttle(wait=vetting):
+            return True
+        if await self.trusted_rcode(name, rdtype) == dns.rcode.NXDOMAIN:
+            self.record(nameserver, 'wrong')
+            return False
+        return True
+
+    async def check_canaries(self):
+        # Resolvers that invent answers for names that cannot exist are dropped up front
+        if not self.trusted:
+            return
+
+        async def check(nameserver):
+            name = f'{uuid.uuid4().hex[:16]}.{CANARY_DOMAIN}'
+            try:
+                response = await dns.asyncquery.udp(dns.message.make_query(name, 'A'), nameserver,
+                                                    timeout=self.timeout)
+            except dns.exception.Timeout:
+                self.record(nameserver, 'timeout')
+                return
+            except (dns.exception.DNSException, OSError):
+                self.record(nameserver, 'error')
+                return
+            if response.rcode() == dns.rcode.NOERROR and response.answer:
+                self.stats[nameserver]['wrong'] = self.max_wrong - 1
+                self.record(nameserver, 'wrong')
+
+        await asyncio.gather(*(check(ns) for ns in self.servers))
+
+    def summary(self):
+        healthy = self.healthy()
+        return {'healthy': len(healthy), 'disabled': len(self.servers) - len(healthy), 'stats': self.stats}
@@ -0,0 +1,74 @@
+"""
+IP scope built from single addresses, CIDR blocks and start-end ranges.
+
+Entries are merged into sorted, non-overlapping integer intervals (one list
+per address family), so membership is a binary search however many
+thousands of blocks the scope file holds.
+
+Usage:
+  from common.scope import Scope
+  scope = Scope.from_file('inscope.txt')
+  if '10.1.2.3' in scope:
+      ...
+"""
+import ipaddress
+from bisect import bisect_right
+from pathlib import Path
+
+
+def parse_entry(entry):
+    """Return (version, first, last) as integers for an IP, CIDR or range."""
+    if '-' in entry:
+        start, end = (ipaddress.ip_address(part.strip()) for part in entry.split('-', 1))
+        if start.version != end.version:
+            raise ValueError(f'mixed address families in {entry}')
+        return start.version, int(min(start, end)), int(max(start, end))
+    network = ipaddress.ip_network(entry, strict=False)
+    return network.version, int(network.network_address), int(network.broadcast_address)
+
+
+class Scope:
+    def __init__(self, entries=()):
+        self.invalid = []
+        intervals = {4: [], 6: []}
+        for entry in entries:
+            entry = entry.split('#', 1)[0].strip()
+            if not entry:
+                continue
+            try:
+                version, first, last = parse_entry(entry)
+            except ValueError:
+                self.invalid.append(entry)
+                continue
+            intervals[version].append((first, last))
+        self.starts = {}
+        self.ends = {}
+        for version, ranges in intervals.items():
+            merged = []
+            for first, last in sorted(ranges):
+                if merged and first <= merged[-1][1] + 1:
+                    merged[-1][1] = max(merged[-1][1], last)
+                else:
+                    merged.append([first, last])
+            self.starts[version] = [first for first, _ in merged]
+            self.ends[version] = [last for _, last in merged]
+
+    @classmethod
+    def from_file(cls, path):
+        return cls(Path(path).read_text().splitlines())
+
+    def __contains__(self, address):
+        try:
+            address = ipaddress.ip_address(str(address).strip())
+        except ValueError:
+            return False
+        starts = self.starts[address.version]
+        value = int(address)
+        index = bisect_right(starts, value) - 1
+        return index >= 0 and value <= self.ends[address.version][index]
+
+    def __len__(self):
+        return sum(len(starts) for starts in self.starts.values())
+
+    def filter(self, addresses):
+        return [address for address in addresses if address in self]
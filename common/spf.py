@@ -0,0 +1,191 @@
+"""
+Recursive SPF expansion into the effective set of sender networks.
+
+Every include:, redirect=, a, mx and ip4/ip6 term is followed down to
+networks, and the DNS-querying terms are counted against the RFC 7208
+limit of 10 lookups. Results are memoized per domain, so large shared
+includes such as _spf.google.com or spf.protection.outlook.com are
+expanded once per run however many domains use them. Terms that cannot be
+turned into networks (ptr, exists, macros) are listed as unresolved.
+
+Usage:
+  from common.spf import SpfExpander
+  expander = SpfExpander()
+  result = await expander.expand('example.com')
+  result['networks']   # ['192.0.2.0/24', '2001:db8::/32', ...]
+  result['lookups']    # DNS-querying terms across the whole tree
+"""
+import asyncio
+import ipaddress
+import re
+
+import dns.exception
+
+from common.dnscache import DnsCache, resolver_query
+
+LOOKUP_LIMIT = 10
+VOID_LIMIT = 2
+# RFC 7208 section 4.6.4: at most 10 MX hosts are looked up per mx term
+MX_LIMIT = 10
+COUNTED_TERMS = ('include', 'a', 'mx', 'ptr', 'exists')
+MODIFIER_RE = re.compile(r'^[A-Za-z][\w.-]*$')
+ADDRESS_TERM_RE = re.compile(r'^(a|mx)(?::([^/]+))?(?:/(\d+))?(?://(\d+))?$', re.IGNORECASE)
+TXT_CHUNK_RE = re.compile(r'"((?:[^"\\]|\\.)*)"')
+
+
+def txt_value(text):
+    # A TXT record may be split into several quoted strings
+    return ''.join(TXT_CHUNK_RE.findall(text)) or text
+
+
+def collapse(networks):
+    by_version = {4: [], 6: []}
+    for network in networks:
+        by_version[network.version].append(network)
+    return [str(network) for version in (4, 6) for network in ipaddress.collapse_addresses(by_version[version])]
+
+
+class SpfExpander:
+    def __init__(self, cache=None, query=None):
+        self.cache = cache or DnsCache.shared()
+        self.query = query or resolver_query()
+        # Completed expansions only; an in-progress one is never awaited twice,
+        # so include loops cannot deadlock
+        self.results = {}
+
+    async def lookup(self, name, rdtype):
+        # Answer texts; [] for NXDOMAIN or no data, None when the lookup failed
+        try:
+            entry = await self.cache.aresolve(name, rdtype, query=self.query)
+        except dns.exception.DNSException:
+            return None
+        return entry['answers']
+
+    async def record(self, domain):
+        answers = await self.lookup(domain, 'TXT')
+        if answers is None:
+            return None, 'temperror'
+        records = [txt_value(answer) for answer in answers]
+        records = [record for record in records if record.lower().startswith('v=spf1 ') or record.lower() == 'v=spf1']
+        if not records:
+            return None, 'none'
+        if len(records) > 1:
+            return records[0], 'permerror: multiple SPF records'
+        return records[0], None
+
+    async def addresses(self, host, cidr4, cidr6):
+        results = await asyncio.gather(self.lookup(host, 'A'), self.lookup(host, 'AAAA'))
+        networks = []
+        for answers, prefix in zip(results, (cidr4, cidr6)):
+            for address in answers or []:
+                networks.append(ipaddress.ip_network(f'{address}/{prefix}', strict=False))
+        return networks
+
+    async def expand(self, domain, path=()):
+        """Return the expansion of domain's SPF policy, memoized per domain."""
+        domain = domain.rstrip('.').lower()
+        if domain in self.results:
+            return self.results[domain]
+        if domain in path:
+            return self.empty(domain, errors=[f'permerror: include loop {" -> ".join(path + (domain,))}'])
+        result = await self._expand(domain, path + (domain,))
+        self.results[domain] = result
+        return result
+
+    def empty(self, domain, record=None, errors=()):
+        return {'domain': domain, 'record': record, 'lookups': 0, 'void_lookups': 0, 'networks': [],
+                'includes': [], 'unresolved': [], 'errors': list(errors)}
+
+    async def _expand(self, domain, path):
+        record, error = await self.record(domain)
+        result = self.empty(domain, record, [f'{domain}: {error}'] if error and error != 'none' else [])
+        if record is None:
+            return result
+
+        networks = []
+        children = []
+        address_terms = []
+        redirect = None
+        has_all = False
+        for term in record.split()[1:]:
+            name, _, value = term.partition('=')
+            if value and MODIFIER_RE.match(name):
+                if name.lower() == 'redirect':
+                    redirect = value
+                continue
+            qualifier = term[0] if term[0] in '+-~?' else '+'
+            mechanism = term.lstrip('+-~?')
+            kind, _, argument = mechanism.partition(':')
+            kind = kind.split('/', 1)[0].lower()
+            if kind in COUNTED_TERMS:
+                result['lookups'] += 1
+            if kind == 'all':
+                has_all = True
+            elif qualifier != '+':
+                # Only pass terms add senders
+                continue
+            elif kind in ('ip4', 'ip6'):
+                try:
+                    networks.append(ipaddress.ip_network(argument, strict=False))
+                except ValueError:
+                    result['errors'].append(f'{domain}: permerror: bad {kind} term {term}')
+            elif kind in ('ptr', 'exists') or '%' in argument:
+                # ptr and exists match per connection, and macros depend on
+                # the sender, so none of them can be expanded ahead of time
+                result['unresolved'].append(f'{domain}: {term}')
+            elif kind == 'include':
+                children.append(argument)
+            elif kind in ('a', 'mx') and ADDRESS_TERM_RE.match(mechanism):
+                groups = ADDRESS_TERM_RE.match(mechanism).groups()
+                if int(groups[2] or 32) > 32 or int(groups[3] or 128) > 128:
+                    result['errors'].append(f'{domain}: permerror: bad prefix length in {term}')
+                    continue
+                address_terms.append(groups)
+            else:
+                result['errors'].append(f'{domain}: permerror: unknown term {term}')
+        if redirect and not has_all:
+            if '%' in redirect:
+                result['unresolved'].append(f'{domain}: redirect={redirect}')
+            else:
+                children.append(redirect)
+            result['lookups'] += 1
+
+        async def expand_address_term(kind, target, cidr4, cidr6):
+            target = target or domain
+            cidr4, cidr6 = int(cidr4 or 32), int(cidr6 or 128)
+            if kind.lower() == 'a':
+                found = await self.addresses(target, cidr4, cidr6)
+            else:
+                exchanges = await self.lookup(target, 'MX') or []
+                hosts = [exchange.split()[-1].rstrip('.') for exchange in exchanges][:MX_LIMIT]
+                found = [network for networks in await asyncio.gather(
+                    *(self.addresses(host, cidr4, cidr6) for host in hosts)) for network in networks]
+            if not found:
+                result['void_lookups'] += 1
+            return found
+
+        expanded, nested = await asyncio.gather(
+            asyncio.gather(*(expand_address_term(*groups) for groups in address_terms)),
+            asyncio.gather(*(self.expand(child, path) for child in children)))
+        for found in expanded:
+            networks.extend(found)
+        for child in nested:
+            if child['record'] is None and not child['errors']:
+                result['void_lookups'] += 1
+                result['errors'].append(f'{domain}: permerror: {child["domain"]} has no SPF record')
+            result['lookups'] += child['lookups']
+            result['void_lookups'] += child['void_lookups']
+            result['includes'] += [child['domain'], *child['includes']]
+            result['unresolved'] += child['unresolved']
+            result['errors'] += child['errors']
+            networks.extend(ipaddress.ip_network(network) for network in child['networks'])
+        # An include reached along two branches reports the same terms twice
+        result['includes'] = [include for include in dict.fromkeys(result['includes']) if include != domain]
+        result['unresolved'] = list(dict.fromkeys(result['unresolved']))
+        result['errors'] = list(dict.fromkeys(result['errors']))
+        if result['lookups'] > LOOKUP_LIMIT:
+            result['errors'].append(f'{domain}: permerror: {result["lookups"]} DNS lookups (limit {LOOKUP_LIMIT})')
+        if result['void_lookups'] > VOID_LIMIT:
+            result['errors'].append(f'{domain}: permerror: {result["void_lookups"]} void lookups (limit {VOID_LIMIT})')
+        result['networks'] = collapse(networks)
+        return result
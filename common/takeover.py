@@ -0,0 +1,226 @@
+"""
+Bulk CNAME chain resolution and subdomain takeover candidates.
+
+Every name's CNAME chain is followed hop by hop through the shared DNS
+cache. Thousands of hosts usually point at a handful of CDN and SaaS names,
+so the tail of a chain that has already been resolved is reused instead of
+being looked up again. Final targets are matched against a suffix index of
+takeover-prone services. Targets that do not exist, or that serve the
+service's "unclaimed" page, are ranked first.
+
+Usage:
+  from common.takeover import find_takeovers
+  candidates = find_takeovers(['shop.example.com', 'docs.example.com'])
+
+From the command line:
+  python3 -m common.takeover -l subdomains.txt -o takeover.json
+"""
+import argparse
+import asyncio
+import json
+import ssl
+
+import aiohttp
+import dns.exception
+
+from common.dnscache import DnsCache, resolver_query
+
+MAX_DEPTH = 16
+
+# suffix -> (service, body fingerprints of an unclaimed resource, claimable when the target is NXDOMAIN)
+PROVIDERS = {
+    'github.io': ('GitHub Pages', ["There isn't a GitHub Pages site here."], False),
+    'herokuapp.com': ('Heroku', ['No such app', 'herokucdn.com/error-pages/no-such-app.html'], False),
+    'herokudns.com': ('Heroku', ['No such app', 'herokucdn.com/error-pages/no-such-app.html'], False),
+    's3.amazonaws.com': ('AWS S3', ['NoSuchBucket', 'The specified bucket does not exist'], False),
+    'elasticbeanstalk.com': ('AWS Elastic Beanstalk', [], True),
+    'cloudapp.net': ('Azure', [], True),
+    'cloudapp.azure.com': ('Azure', [], True),
+    'azurewebsites.net': ('Azure App Service', [], True),
+    'trafficmanager.net': ('Azure Traffic Manager', [], True),
+    'blob.core.windows.net': ('Azure Blob Storage', ['The specified resource does not exist.'], True),
+    'azureedge.net': ('Azure CDN', [], True),
+    'azure-api.net': ('Azure API Management', [], True),
+    'azurecontainer.io': ('Azure Container Instances', [], True),
+    'redis.cache.windows.net': ('Azure Cache for Redis', [], True),
+    'servicebus.windows.net': ('Azure Service Bus', [], True),
+    'myshopify.com': ('Shopify', ['Sorry, this shop is currently unavailable.'], False),
+    'ghost.io': ('Ghost', ['Failed to resolve DNS path for this host'], False),
+    'surge.sh': ('Surge', ['project not found'], False),
+    'bitbucket.io': ('Bitbucket', ['Repository not found'], False),
+    'pantheonsite.io': ('Pantheon', ['The gods are wise, but do not know of the site which you seek.'], False),
+    'zendesk.com': ('Zendesk', ['Help Center Closed'], False),
+    'readme.io': ('ReadMe', ['Project doesnt exist... yet!'], False),
+    'wordpress.com': ('WordPress.com', ['Do you want to register'], False),
+    'helpscoutdocs.com': ('Help Scout', ['No settings were found for this company:'], False),
+    'unbouncepages.com': ('Unbounce', ['The requested URL was not found on this server.'], False),
+    'agilecrm.com': ('Agile CRM', ['Sorry, this page is no longer available.'], False),
+    'uservoice.com': ('UserVoice', ['This UserVoice subdomain is currently available!'], False),
+    'webflow.io': ('Webflow', ["The page you are looking for doesn't exist or has been moved."], False),
+    'ngrok.io': ('ngrok', ['ngrok.io not found'], False),
+    'launchrock.com': ('LaunchRock', ['It looks like you may have taken a wrong turn somewhere.'], False),
+    'helpjuice.com': ('Helpjuice', ["We could not find what you're looking for."], False),
+    'smartjobboard.com': ('SmartJobBoard', ['This job board website is either expired or its domain name is invalid.'], False),
+}
+
+
+def match_provider(target):
+    # One dict lookup per label suffix, longest suffix first
+    labels = target.rstrip('.').lower().split('.')
+    for start in range(len(labels)):
+        suffix = '.'.join(labels[start:])
+        if suffix in PROVIDERS:
+            return suffix, PROVIDERS[suffix]
+    return None, None
+
+
+class ChainResolver:
+    def __init__(self, cache=None, query=None, concurrency=200):
+        self.cache = cache or DnsCache.shared()
+        self.query = query or resolver_query()
+        self.semaphore = asyncio.Semaphore(concurrency)
+        # name -> (rest of the chain after name, final status); shared by every chain through name
+        self.tails = {}
+
+    async def lookup(self, name, rdtype):
+        async with self.semaphore:
+            try:
+                return await self.cache.aresolve(name, rdtype, query=self.query)
+            except dns.exception.Timeout:
+                return 'TIMEOUT'
+            except dns.exception.DNSException:
+                return 'SERVFAIL'
+
+    async def terminal_status(self, name):
+        # A name without a CNAME: does it have addresses at all?
+        results = await asyncio.gather(self.lookup(name, 'A'), self.lookup(name, 'AAAA'))
+        if any(isinstance(entry, dict) and entry['answers'] for entry in results):
+            return 'NOERROR'
+        for entry in results:
+            if isinstance(entry, str):
+                return entry
+            if entry['rcode'] == 'NXDOMAIN':
+                return 'NXDOMAIN'
+        return 'NODATA'
+
+    async def chain(self, name):
+        """Return (chain of names starting with name, status of the final target)."""
+        hops = [name.rstrip('.').lower()]
+        status = None
+        while status is None:
+            current = hops[-1]
+            if current in self.tails:
+                tail, status = self.tails[current]
+                hops.extend(tail)
+                break
+            if len(hops) > MAX_DEPTH or current in hops[:-1]:
+                status = 'LOOP'
+                break
+            entry = await self.lookup(current, 'CNAME')
+            if isinstance(entry, str):
+                status = entry
+            elif entry['rcode'] == 'NXDOMAIN':
+                status = 'NXDOMAIN'
+            elif entry['answers']:
+                hops.append(entry['answers'][0].rstrip('.').lower())
+            else:
+                status = await self.terminal_status(current)
+        for index, hop in enumerate(hops):
+            self.tails.setdefault(hop, (hops[index + 1:], status))
+        return hops, status
+
+    async def resolve_all(self, names):
+        chains = await asyncio.gather(*(self.chain(name) for name in names))
+        return dict(zip(names, chains))
+
+
+async def fetch_bodies(hosts, concurrency=50, timeout=10, read_limit=65536):
+    ssl_context = ssl.create_default_context()
+    ssl_context.check_hostname = False
+    ssl_context.verify_mode = ssl.CERT_NONE
+    connector = aiohttp.TCPConnector(limit=concurrency, ssl=ssl_context)
+    bodies = {}
+
+    async def fetch(session, host):
+        for scheme in ('https', 'http'):
+            try:
+                async with session.get(f'{scheme}://{host}', timeout=aiohttp.ClientTimeout(total=timeout)) as resp:
+                    bodies[host] = (await resp.content.read(read_limit)).decode('utf-8', 'replace')
+                    return
+            except (aiohttp.ClientError, asyncio.TimeoutError, ssl.SSLError, OSError, ValueError):
+                continue
+
+    async with aiohttp.ClientSession(connector=connector) as session:
+        await asyncio.gather(*(fetch(session, host) for host in hosts))
+    return bodies
+
+
+def rank_candidates(chains, bodies=None):
+    """Turn {name: (chain, status)} into takeover candidates, most likely first."""
+    bodies = bodies or {}
+    candidates = []
+    for name, (hops, status) in chains.items():
+        if len(hops) < 2:
+            continue
+        target = hops[-1]
+        suffix, provider = match_provider(target)
+        candidate = {'name': name, 'chain': hops, 'target': target, 'status': status,
+                     'service': provider[0] if provider else None, 'score': 0, 'reason': None}
+        if provider:
+            service, fingerprints, claimable = provider
+            body = bodies.get(name)
+            matched = next((fingerprint for fingerprint in fingerprints if body and fingerprint in body), None)
+            if status == 'NXDOMAIN' and claimable:
+                candidate.update(score=100, reason=f'{service} resource {target} does not exist')
+            elif matched:
+                candidate.update(score=90, reason=f'{service} unclaimed page: "{matched}"')
+            elif status == 'NXDOMAIN':
+                candidate.update(score=70, reason=f'{service} target {target} does not exist')
+            else:
+                candidate.update(score=10, reason=f'Points at {service}')
+        elif status == 'NXDOMAIN':
+            candidate.update(score=60, reason=f'Dangling CNAME; {target} does not exist')
+        else:
+            continue
+        candidates.append(candidate)
+    candidates.sort(key=lambda candidate: (-candidate['score'], candidate['name']))
+    return candidates
+
+
+async def check_takeovers(names, query=None, concurrency=200, fingerprints=True):
+    resolver = ChainResolver(query=query, concurrency=concurrency)
+    chains = await resolver.resolve_all(list(dict.fromkeys(names)))
+    bodies = {}
+    if fingerprints:
+        # Only hosts whose target is a known service and still resolves have a page to check
+        hosts = []
+        for name, (hops, status) in chains.items():
+            _, provider = match_provider(hops[-1])
+            if len(hops) > 1 and status == 'NOERROR' and provider and provider[1]:
+                hosts.append(name)
+        bodies = await fetch_bodies(hosts)
+    return rank_candidates(chains, bodies)
+
+
+def find_takeovers(names, query=None, concurrency=200, fingerprints=True):
+    return asyncio.run(check_takeovers(names, query=query, concurrency=concurrency, fingerprints=fingerprints))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Rank subdomain takeover candidates from CNAME chains')
+    parser.add_argument('-l', '--list', required=True, help='File of subdomains, one per line')
+    parser.add_argument('-o', '--output', help='Write candidates as JSON to this file')
+    parser.add_argument('--no-fingerprints', action='store_true', help='Skip fetching pages to match service fingerprints')
+    args = parser.parse_args()
+    with open(args.list) as f:
+        names = [line.strip() for line in f if line.strip() and not line.startswith('#')]
+    candidates = find_takeovers(names, fingerprints=not args.no_fingerprints)
+    for candidate in candidates:
+        print(f"[{candidate['score']}] {candidate['name']} -> {' -> '.join(candidate['chain'][1:])}: {candidate['reason']}")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(candidates, f, indent=4)
+
+
+if __name__ == '__main__':
+    main()
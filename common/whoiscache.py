@@ -0,0 +1,103 @@
+"""
+Persistent TTL cache for WHOIS lookups.
+
+Entries are keyed by registrable domain (sub.example.co.uk -> example.co.uk)
+or by ASN (AS13335) and stored as one JSON file per key, so every module and
+every run shares the same answers. Failed lookups are cached too, for a
+shorter time, so a throttling registrar is not hammered with retries.
+
+Usage:
+  from common.whoiscache import WhoisCache
+  cache = WhoisCache()
+  data = cache.lookup('www.example.com', fetch_whois)
+  many = cache.bulk_lookup(['a.com', 'b.com'], fetch_whois)
+"""
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import tldextract
+
+CACHE_DIR = os.path.join(os.environ.get('RECON_CACHE_DIR', os.path.expanduser('~/.cache/recon-engine')), 'whois')
+DEFAULT_TTL = 7 * 24 * 3600
+NEGATIVE_TTL = 3600
+
+ASN_RE = re.compile(r'^AS(\d+)$', re.IGNORECASE)
+# Use the bundled public suffix snapshot; keying must not depend on network access
+_extract = tldextract.TLDExtract(suffix_list_urls=())
+
+
+def cache_key(target):
+    target = target.strip().rstrip('.').lower()
+    match = ASN_RE.match(target)
+    if match:
+        return f"AS{match.group(1)}"
+    ext = _extract(target)
+    if ext.domain and ext.suffix:
+        return f"{ext.domain}.{ext.suffix}"
+    return target
+
+
+def is_failure(result):
+    return result is None or (isinstance(result, dict) and 'error' in result)
+
+
+class WhoisCache:
+    def __init__(self, path=CACHE_DIR, ttl=DEFAULT_TTL, negative_ttl=NEGATIVE_TTL):
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+
+    def _file(self, key):
+        return os.path.join(self.path, re.sub(r'[^\w.-]', '_', key) + '.json')
+
+    def _lock(self, key):
+        with self._locks_guard:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def get(self, key):
+        try:
+            with open(self._file(key)) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        ttl = self.negative_ttl if entry.get('negative') else self.ttl
+        if time.time() - entry.get('fetched_at', 0) > ttl:
+            return None
+        return entry
+
+    def put(self, key, data):
+        os.makedirs(self.path, exist_ok=True)
+        entry = {'key': key, 'fetched_at': time.time(), 'negative': is_failure(data), 'data': data}
+        tmp = f"{self._file(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump(entry, f)
+        os.replace(tmp, self._file(key))
+        return entry
+
+    def lookup(self, target, fetch):
+        """Return cached data for target, calling fetch(key) only on a miss."""
+        key = cache_key(target)
+        # Concurrent lookups of the same key wait for one fetch instead of racing
+        with self._lock(key):
+            entry = self.get(key)
+            if entry is None:
+                entry = self.put(key, fetch(key))
+        return entry['data']
+
+    def bulk_lookup(self, targets, fetch, workers=4):
+        keys = {target: cache_key(target) for target in targets}
+        misses = [key for key in dict.fromkeys(keys.values()) if self.get(key) is None]
+        if misses:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                list(pool.map(lambda key: self.lookup(key, fetch), misses))
+        results = {}
+        for target, key in keys.items():
+            entry = self.get(key)
+            results[target] = entry['data'] if entry else None
+        return results
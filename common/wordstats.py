@@ -0,0 +1,114 @@
+"""
+Per-label brute-force statistics learned across scans.
+
+Every label a brute force tries is counted, along with whether it resolved
+(wildcard answers excluded). Wordlists can then be served best-first by hit
+rate, or cut to the N most productive labels for time-boxed scans. Counts
+live in one SQLite file so every run adds to the same history.
+
+Usage:
+  from common.wordstats import WordStats
+  stats = WordStats()
+  for label in stats.rank(words):          # or stats.top(words, 5000)
+      ...
+      stats.record(label, hit=resolved)
+  stats.flush()
+"""
+import heapq
+import os
+import sqlite3
+import threading
+import time
+
+STATS_FILE = os.path.join(os.environ.get('RECON_CACHE_DIR', os.path.expanduser('~/.cache/recon-engine')),
+                          'wordstats.sqlite')
+# Untried labels score PRIOR_HITS, so they rank above labels that keep missing
+PRIOR_HITS = 0.1
+# SQLite's default limit on bound parameters per statement is 999
+CHUNK = 900
+
+
+def score(tried, hits):
+    return (hits + PRIOR_HITS) / (tried + 1)
+
+
+class WordStats:
+    def __init__(self, path=STATS_FILE, flush_every=5000):
+        self.path = path
+        self.flush_every = flush_every
+        self.pending = {}
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute('CREATE TABLE IF NOT EXISTS labels (label TEXT PRIMARY KEY, tried INTEGER NOT NULL, '
+                        'hits INTEGER NOT NULL, last_hit REAL)')
+        self.db.commit()
+
+    def record(self, label, hit=False):
+        with self._lock:
+            counts = self.pending.setdefault(label.lower(), [0, 0])
+            counts[0] += 1
+            counts[1] += bool(hit)
+            if len(self.pending) < self.flush_every:
+                return
+        self.flush()
+
+    def flush(self):
+        with self._lock:
+            pending, self.pending = self.pending, {}
+            if not pending:
+                return
+            now = time.time()
+            self.db.executemany(
+                'INSERT INTO labels (label, tried, hits, last_hit) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT(label) DO UPDATE SET tried = tried + excluded.tried, hits = hits + excluded.hits, '
+                'last_hit = COALESCE(excluded.last_hit, last_hit)',
+                [(label, tried, hits, now if hits else None) for label, (tried, hits) in pending.items()])
+            self.db.commit()
+
+    def counts(self, labels):
+        """Return {label: (tried, hits)} for the labels that have history."""
+        found = {}
+        labels = list(labels)
+        with self._lock:
+            for start in range(0, len(labels), CHUNK):
+                chunk = labels[start:start + CHUNK]
+                rows = self.db.execute(f'SELECT label, tried, hits FROM labels WHERE label IN '
+                                       f'({",".join("?" * len(chunk))})', chunk)
+                found.update((label, (tried, hits)) for label, tried, hits in rows)
+        return found
+
+    def _scored(self, words):
+        # (score, -position, label) in chunks, so ties keep wordlist order
+        chunk = []
+        position = 0
+        for word in words:
+            chunk.append(word)
+            if len(chunk) == CHUNK:
+                yield from self._score_chunk(chunk, position)
+                position += len(chunk)
+                chunk = []
+        yield from self._score_chunk(chunk, position)
+
+    def _score_chunk(self, chunk, position):
+        history = self.counts(word.lower() for word in chunk)
+        for offset, word in enumerate(chunk):
+            tried, hits = history.get(word.lower(), (0, 0))
+            yield score(tried, hits), -(position + offset), word
+
+    def rank(self, words):
+        """Return words reordered by past hit rate, best first.
+
+        Unseen labels keep their wordlist order and sit between labels that
+        have resolved before and labels that have only ever missed.
+        """
+        return [word for _, _, word in sorted(self._scored(dict.fromkeys(words)), reverse=True)]
+
+    def top(self, words, count):
+        """Return the count best words; memory is bounded by count, not the wordlist."""
+        best = heapq.nlargest(count, self._scored(words))
+        return list(dict.fromkeys(word for _, _, word in best))
+
+    def close(self):
+        self.flush()
+        self.db.close()
@@ -1,28 +1,33 @@
-import subprocess
 import json
-import re
 from urllib.parse import urlparse
 
+import msdnsscan
+
 def extract_domain(url):
     parsed_url = urlparse(url)
     if parsed_url.netloc:
         return parsed_url.netloc
     return parsed_url.path  # if no scheme like https://
 
-def run_msdnsscan(domain):
-    try:
-        result = subprocess.run(
-            ['python3', 'msdnsscan.py', '-d', domain, '-a'],
-            capture_output=True, text=True, check=True
-        )
-        return result.stdout
-    except subprocess.CalledProcessError as e:
-        print("[!] Error running msdnsscan:", e)
-        return ""
+def emit(sink, section, record):
+    # Stream each record as soon as msdnsscan produces it
+    sink.write(json.dumps({"section": section, "record": record}) + "\n")
+    sink.flush()
+
+def subdomain_entry(record):
+    details = f"[{record['status_code']}]" if record['status_code'] is not None else ""
+    if record['headers']:
+        details += " " + "/".join(f"[{header}]" for header in record['headers'])
+    return {
+        "Subdomain": record['subdomain'],
+        "IP": ", ".join(record['ip']),
+        "Details": details.strip()
+    }
 
-def parse_msdnsscan_output(output):
+def run_msdnsscan(domain, sink):
     sections = {
         "A_Records": [],
+        "AAAA_Records": [],
         "NS_Records": [],
         "CNAME_Records": [],
         "MX_Records": [],
@@ -31,79 +36,69 @@ def parse_msdnsscan_output(output):
         "SRV_Records": [],
         "TXT_Records": [],
         "SPF_Records": [],
+        "SPF_Networks": [],
+        "SPF_Lookups": None,
         "DMARC_Records": [],
         "DKIM_Records": [],
         "Zone_Transfer_Records": [],
         "Subdomains": []
     }
-    
-    current_section = None
-    lines = output.splitlines()
+    msdnsscan.configure(domain, all=True)
+
+    records = msdnsscan.main(domain)
+    if records is None:
+        print(f"[!] {domain} does not exist")
+        return None
+    for record_type, values in records.items():
+        section = f"{record_type}_Records"
+        sections[section] = values
+        for value in values:
+            emit(sink, section, value)
 
-    for line in lines:
-        line = line.strip()
-        
-        if line.startswith("A Records"):
-            current_section = "A_Records"
-        elif line.startswith("NS Records"):
-            current_section = "NS_Records"
-        elif line.startswith("CNAME records"):
-            current_section = "CNAME_Records"
-        elif line.startswith("MX Records"):
-            current_section = "MX_Records"
-        elif line.startswith("PTR Records"):
-            current_section = "PTR_Records"
-        elif line.startswith("SOA Records"):
-            current_section = "SOA_Records"
-        elif line.startswith("SRV Records"):
-            current_section = "SRV_Records"
-        elif line.startswith("TXT Records"):
-            current_section = "TXT_Records"
-        elif line.startswith("Email Records"):
-            current_section = "Email_Records"
-        elif line.startswith("Zone Transfer Records"):
-            current_section = "Zone_Transfer_Records"
-        elif "Checking for subdomains" in line:
-            current_section = "Subdomains"
-        
-        elif current_section and line and not line.startswith("[info]") and not line.startswith("--------------------------------------------------"):
-            if current_section == "Email_Records":
-                if "[spf record]" in line.lower():
-                    sections["SPF_Records"].append(line)
-                elif "dmarc data not found" in line.lower():
-                    sections["DMARC_Records"].append("Not Found")
-                elif "dkim data not found" in line.lower():
-                    sections["DKIM_Records"].append("Not Found")
-            elif current_section == "Subdomains":
-                parts = re.split(r'\s-\s', line)
-                if len(parts) >= 2:
-                    subdomain_info = {
-                        "Subdomain": parts[0],
-                        "IP": parts[1],
-                        "Details": parts[2] if len(parts) >= 3 else ""
-                    }
-                    sections["Subdomains"].append(subdomain_info)
-            else:
-                sections[current_section].append(line)
-    
+    mail = msdnsscan.email(domain)
+    sections["SPF_Records"] = mail["spf"]
+    sections["DMARC_Records"] = mail["dmarc"] or ["Not Found"]
+    sections["DKIM_Records"] = [dkim["record"] for dkim in mail["dkim"]] or ["Not Found"]
+    if "spf_expanded" in mail:
+        sections["SPF_Networks"] = mail["spf_expanded"]["networks"]
+        sections["SPF_Lookups"] = mail["spf_expanded"]["lookups"]
+        emit(sink, "SPF_Lookups", sections["SPF_Lookups"])
+    for section in ("SPF_Records", "SPF_Networks", "DMARC_Records", "DKIM_Records"):
+        for value in sections[section]:
+            emit(sink, section, value)
+
+    transfer = msdnsscan.zone_transfer(domain)
+    if transfer:
+        for record in transfer["records"]:
+            entry = {"Nameserver": transfer["nameserver"], "IP": transfer["ip"], **record}
+            sections["Zone_Transfer_Records"].append(entry)
+            emit(sink, "Zone_Transfer_Records", entry)
+
+    def on_subdomain(record):
+        entry = subdomain_entry(record)
+        sections["Subdomains"].append(entry)
+        emit(sink, "Subdomains", entry)
+
+    msdnsscan.subdom_finder(domain, on_result=on_subdomain)
     return sections
 
 def main():
     url = input("Enter the URL (e.g., https://saptanglabs.com): ").strip()
     domain = extract_domain(url)
     print(f"[*] Extracted domain: {domain}")
-    
+
     print("[*] Running MSDNS Scan...")
-    output = run_msdnsscan(domain)
-    if output:
-        print("[*] Parsing results...")
-        parsed_data = parse_msdnsscan_output(output)
+    stream_name = f"{domain}_dns_scan.jsonl"
+    with open(stream_name, 'w') as sink:
+        parsed_data = run_msdnsscan(domain, sink)
+    print(f"[+] Streamed records to {stream_name}")
+    if parsed_data:
         filename = f"{domain}_dns_scan.json"
         with open(filename, 'w') as f:
             json.dump(parsed_data, f, indent=4)
         print(f"[+] Results saved to {filename}")
     else:
-        print("[!] No output captured.")
+        print("[!] No results.")
 
 if __name__ == "__main__":
     main()
@@ -1,18 +1,39 @@
+import dns.asyncquery
+import dns.exception
+import dns.rdatatype
 import dns.resolver
 import dns.zone
 import sys
+import asyncio
+import random
+import uuid
+import time
 from colorama import Fore, Style, init
 import requests
+import requests.adapters
 import argparse
+import threading
 import textwrap
 import os
 from datetime import datetime
 import urllib.request
-from pathlib import Path
-import concurrent.futures
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from itertools import islice
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.dnscache import DnsCache, resolver_query
+from common.permute import ScalableBloomFilter, load_environments, permutations, remember
+from common.resolvers import ResolverPool, read_resolver_file
+from common.scope import Scope
+from common.spf import LOOKUP_LIMIT, SpfExpander
+from common.wordstats import WordStats
+import zonewalk
 
-def options():
+dns_cache = DnsCache.shared()
+
+
+def build_parser():
     opt_parser = argparse.ArgumentParser(formatter_class=argparse.RawDescriptionHelpFormatter, epilog=textwrap.dedent(
         '''Example: python3 msdnsscan.py -d example.com -a 
 Example: python3 msdnsscan.py -d example.com -s
@@ -41,27 +62,94 @@ Example: python3 msdnsscan.py -d example.com -s
         '-md', '--markdown', help='Write results of subdomain scan to a markdown file for use with Xmind', action='store_true'
     )
     opt_parser.add_argument(
-        '-il', '--input', help='Check subdomain output against a list of IP addresses')
+        '-il', '--input', help='Only report subdomains resolving into a scope file of IP addresses, CIDR blocks or start-end ranges')
+    opt_parser.add_argument(
+        '-c', '--concurrent', help='Number of DNS queries kept in flight during subdomain brute-force. DEFAULT - 200', required=False
+    )
+    opt_parser.add_argument(
+        '-hc', '--http-concurrent', help='Number of HTTP probes to run at once for resolved subdomains. DEFAULT - 20', required=False
+    )
+    opt_parser.add_argument(
+        '-ds', '--dkim-selectors', help='File of extra DKIM selectors to check alongside dkim_selectors.txt', required=False
+    )
+    opt_parser.add_argument(
+        '-p', '--progress', help='Print subdomain brute-force progress every N seconds', required=False
+    )
+    opt_parser.add_argument(
+        '-r', '--resolvers', help='File of resolver IPs to spread subdomain brute-force queries across', required=False
+    )
+    opt_parser.add_argument(
+        '-tr', '--trusted', help='File of trusted resolver IPs used to check answers from the -r list. DEFAULT - 1.1.1.1, 8.8.8.8, 9.9.9.9', required=False
+    )
+    opt_parser.add_argument(
+        '-pm', '--permute', help='Brute-force permutations of found subdomains (numeric increments, environment swaps, dev-/-staging affixes)', action='store_true'
+    )
     opt_parser.add_argument(
-        '-c', '--concurrent', help='Number of concurrent requests to run. DEFAULT - 10. Anything greater can be unstable', required=False
+        '-pb', '--permute-budget', help='Maximum number of permutations to try, most likely first. DEFAULT - 50000', required=False
     )
+    opt_parser.add_argument(
+        '-rk', '--ranked', help='Try wordlist labels in order of their hit rate across past scans', action='store_true'
+    )
+    opt_parser.add_argument(
+        '-tn', '--top', help='Only try the N labels with the best hit rate across past scans', required=False
+    )
+    opt_parser.add_argument(
+        '-wk', '--walk', help='List a DNSSEC-signed zone by NSEC walking, or NSEC3 hash collection and cracking', action='store_true'
+    )
+    return opt_parser
+
+
+def options():
     global args
+    opt_parser = build_parser()
     args = opt_parser.parse_args()
     if len(sys.argv) == 1:
         opt_parser.print_help()
         opt_parser.exit()
 
 
+def configure(domain, quiet=True, **overrides):
+    """Set up module state for in-process use instead of parsing sys.argv.
+
+    overrides use the long option names, e.g. configure('example.com', wordlist='words.txt').
+    """
+    global args, quiet_mode
+    args = build_parser().parse_args(['-d', domain])
+    for key, value in overrides.items():
+        setattr(args, key, value)
+    quiet_mode = quiet
+    return args
+
+
 def style():
     global success, info, fail, servertype
     success, info, fail, servertype = Fore.GREEN + Style.BRIGHT, Fore.YELLOW + Style.BRIGHT, Fore.RED + Style.BRIGHT, Fore.WHITE + Style.BRIGHT
 
 
+def output(text):
+    if not quiet_mode:
+        print(text)
+
+
+# Uncoloured until style() runs, so the module can be imported and called directly
+success = info = fail = servertype = ''
+quiet_mode = False
+
+
 record_types = ['A', 'AAAA', 'NS', 'CNAME', 'MX', 'PTR', 'SOA', 'SRV',
                 'TXT']
 subdomain_array = ['a', 'acceptatie', 'access', 'accounting', 'accounts', 'ad', 'adm', 'admin', 'administrator', 'ads', 'adserver', 'affiliate', 'affiliates', 'agenda', 'alpha', 'alumni', 'analytics', 'ann', 'api', 'apollo', 'app', 'apps', 'ar', 'archive', 'art', 'assets', 'atlas', 'auth', 'auto', 'autoconfig', 'autodiscover', 'av', 'ayuda', 'b', 'b2b', 'backup', 'backups', 'banner', 'barracuda', 'bb', 'bbs', 'beta', 'biblioteca', 'billing', 'blackboard', 'blog', 'blogs', 'board', 'book', 'booking', 'bookings', 'broadcast-ip', 'bsd', 'bt', 'bug', 'bugs', 'business', 'c', 'ca', 'cache', 'cacti', 'cal', 'calendar', 'cam', 'careers', 'cart', 'cas', 'catalog', 'catalogo', 'catalogue', 'cc', 'cctv', 'cdn', 'cdn1', 'cdn2', 'chat', 'chimera', 'chronos', 'ci', 'cisco', 'citrix', 'classroom', 'client', 'clientes', 'clients', 'cloud', 'cloudflare-resolve-to', 'club', 'cms', 'cn', 'co', 'community', 'conference', 'config', 'connect', 'contact', 'contacts', 'content', 'control', 'controller', 'controlp', 'controlpanel', 'corp', 'corporate', 'correo', 'correoweb', 'cp', 'cpanel', 'crm', 'cs', 'css', 'customers', 'cvs', 'd', 'da', 'data', 'database', 'db', 'db1', 'db2', 'dbadmin', 'dbs', 'dc', 'de', 'default', 'demo', 'demo2', 'demon', 'demostration', 'descargas', 'design', 'desktop', 'dev', 'dev01', 'dev1', 'dev2', 'devel', 'developers', 'development', 'dialin', 'diana', 'direct', 'directory', 'dl', 'dmz', 'dns', 'dns1', 'dns2', 'dns3', 'dns4', 'doc', 'docs', 'domain', 'domain-controller', 'domainadmin', 'domaincontrol', 'domaincontroller', 'domaincontrolpanel', 'domainmanagement', 'domains', 'download', 'downloads', 'drupal', 'e', 'eaccess', 'echo', 'ecommerce', 'edu', 'ektron', 'elearning', 'email', 'en', 'eng', 'english', 'enterpriseenrollment', 'enterpriseregistration', 'erp', 'es', 'event', 'events', 'ex', 'example', 'examples', 'exchange', 'external', 'extranet', 'f', 'facebook', 'faq', 'fax', 'fb', 'feedback', 'feeds', 'file', 'files', 'fileserver', 'finance', 'firewall', 'folders', 'forms', 'foro', 'foros', 'forum', 'forums', 'foto', 'fr', 'free', 'freebsd', 'fs', 'ftp', 'ftp1', 'ftp2', 'ftpadmin', 'ftpd', 'fw', 'g', 'galeria', 'gallery', 'game', 'games', 'gate', 'gateway', 'gilford', 'gis', 'git', 'gmail', 'go', 'google', 'groups', 'groupwise', 'gu', 'guest', 'guia', 'guide', 'gw', 'health', 'help', 'helpdesk', 'hera', 'heracles', 'hercules', 'hermes', 'home', 'homer', 'host', 'host2', 'hosting', 'hotspot', 'hr', 'hypernova', 'i', 'id', 'idp', 'im', 'image', 'images', 'images1', 'images2', 'images3', 'images4', 'images5', 'images6', 'images7', 'images8', 'imail', 'imap', 'imap3', 'imap3d', 'imapd', 'imaps', 'img', 'img1', 'img2', 'img3', 'imgs', 'imogen', 'in', 'incoming', 'info', 'inmuebles', 'internal', 'interno', 'intra', 'intranet', 'io', 'ip', 'ip6', 'ipfixe', 'iphone', 'ipmi', 'ipsec', 'ipv4', 'ipv6', 'irc', 'ircd', 'is', 'isa', 'it', 'j', 'ja', 'jabber', 'jboss', 'jboss2', 'jira', 'job', 'jobs', 'jp', 'js', 'jupiter', 'k', 'kb', 'kerberos', 'l', 'la', 'lab', 'laboratories', 'laboratorio', 'laboratory', 'labs', 'ldap', 'legacy', 'lib', 'library', 'link', 'links', 'linux', 'lisa', 'list', 'lists', 'live', 'lms', 'local', 'localhost', 'log', 'loghost', 'login', 'logon', 'logs', 'london', 'loopback', 'love', 'lp', 'lync', 'lyncdiscover', 'm', 'm1', 'm2', 'magento', 'mail', 'mail01', 'mail1', 'mail2', 'mail3', 'mail4', 'mail5', 'mailadmin', 'mailbackup', 'mailbox', 'mailer', 'mailgate', 'mailhost', 'mailing', 'mailman', 'mailserver', 'main', 'manage', 'manager', 'mantis', 'map', 'maps', 'market', 'marketing', 'mars', 'master', 'math', 'mb', 'mc', 'mdm', 'media',
                    'meet', 'member', 'members', 'mercury', 'meta', 'meta01', 'meta02', 'meta03', 'meta1', 'meta2', 'meta3', 'miembros', 'mijn', 'minerva', 'mirror', 'ml', 'mm', 'mob', 'mobil', 'mobile', 'monitor', 'monitoring', 'moodle', 'movil', 'mrtg', 'ms', 'msoid', 'mssql', 'munin', 'music', 'mx', 'mx-a', 'mx-b', 'mx0', 'mx01', 'mx02', 'mx03', 'mx1', 'mx2', 'mx3', 'my', 'mysql', 'mysql2', 'n', 'nagios', 'nas', 'nat', 'nelson', 'neon', 'net', 'netmail', 'netscaler', 'network', 'network-ip', 'networks', 'new', 'newmail', 'news', 'newsgroups', 'newsite', 'newsletter', 'nl', 'noc', 'novell', 'ns', 'ns0', 'ns01', 'ns02', 'ns03', 'ns1', 'ns10', 'ns11', 'ns12', 'ns2', 'ns3', 'ns4', 'ns5', 'ns6', 'ns7', 'ns8', 'nt', 'ntp', 'ntp1', 'o', 'oa', 'office', 'office2', 'old', 'oldmail', 'oldsite', 'oldwww', 'on', 'online', 'op', 'openbsd', 'operation', 'operations', 'ops', 'ora', 'oracle', 'origin', 'orion', 'os', 'osx', 'ou', 'outgoing', 'outlook', 'owa', 'ox', 'p', 'painel', 'panel', 'partner', 'partners', 'pay', 'payment', 'payments', 'pbx', 'pcanywhere', 'pda', 'pegasus', 'pendrell', 'personal', 'pgsql', 'phoenix', 'photo', 'photos', 'php', 'phpmyadmin', 'pm', 'pma', 'poczta', 'pop', 'pop3', 'portal', 'portfolio', 'post', 'postgres', 'postgresql', 'postman', 'postmaster', 'pp', 'ppp', 'pr', 'pre-prod', 'pre-production', 'preprod', 'press', 'preview', 'private', 'pro', 'prod', 'production', 'project', 'projects', 'promo', 'proxy', 'prueba', 'pruebas', 'pt', 'pub', 'public', 'q', 'qa', 'r', 'ra', 'radio', 'radius', 'ras', 'rdp', 'redirect', 'redmine', 'register', 'relay', 'remote', 'remote2', 'repo', 'report', 'reports', 'repos', 'research', 'resources', 'restricted', 'reviews', 'robinhood', 'root', 'router', 'rss', 'rt', 'rtmp', 'ru', 's', 's1', 's2', 's3', 's4', 'sa', 'sales', 'sample', 'samples', 'sandbox', 'sc', 'search', 'secure', 'security', 'seo', 'server', 'server1', 'server2', 'service', 'services', 'sftp', 'share', 'sharepoint', 'shell', 'shop', 'shopping', 'signup', 'sip', 'site', 'siteadmin', 'sitebuilder', 'sites', 'skype', 'sms', 'smtp', 'smtp1', 'smtp2', 'smtp3', 'snmp', 'social', 'software', 'solaris', 'soporte', 'sp', 'spam', 'speedtest', 'sport', 'sports', 'sql', 'sqlserver', 'squirrel', 'squirrelmail', 'ssh', 'ssl', 'sslvpn', 'sso', 'st', 'staff', 'stage', 'staging', 'start', 'stat', 'static', 'static1', 'static2', 'stats', 'status', 'storage', 'store', 'stream', 'streaming', 'student', 'sun', 'support', 'survey', 'sv', 'svn', 't', 'team', 'tech', 'telewerk', 'telework', 'temp', 'test', 'test1', 'test2', 'test3', 'testing', 'testsite', 'testweb', 'tfs', 'tftp', 'thumbs', 'ticket', 'tickets', 'time', 'tools', 'trac', 'track', 'tracker', 'tracking', 'train', 'training', 'travel', 'ts', 'tunnel', 'tutorials', 'tv', 'tw', 'u', 'uat', 'uk', 'unix', 'up', 'update', 'upload', 'uploads', 'us', 'user', 'users', 'v', 'v2', 'vc', 'ventas', 'video', 'videos', 'vip', 'virtual', 'vista', 'vle', 'vm', 'vms', 'vmware', 'vnc', 'vod', 'voip', 'vpn', 'vpn1', 'vpn2', 'vpn3', 'vps', 'vps1', 'vps2', 'w', 'w3', 'wap', 'wc', 'web', 'web0', 'web01', 'web02', 'web03', 'web1', 'web2', 'web3', 'web4', 'web5', 'webadmin', 'webcam', 'webconf', 'webct', 'webdb', 'webdisk', 'weblog', 'webmail', 'webmail2', 'webmaster', 'webmin', 'webservices', 'webstats', 'webstore', 'whm', 'wifi', 'wiki', 'win', 'win32', 'windows', 'wordpress', 'work', 'wp', 'ws', 'wsus', 'ww', 'ww0', 'ww01', 'ww02', 'ww03', 'ww1', 'ww2', 'ww3', 'www', 'www-test', 'www0', 'www01', 'www02', 'www03', 'www1', 'www2', 'www3', 'www4', 'www5', 'www6', 'www7', 'wwwm', 'wwwold', 'wwww', 'x', 'xml', 'zabbix', 'zeus', 'zimbra']
 subdom_file = []
+query_timeout = 2.0
+query_retries = 2
+http_timeout = 10
+wildcard_probes = 3
+wildcard_reprobes = 25
+lookup_budget = 10.0
+xfr_deadline = 10.0
+selector_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dkim_selectors.txt')
+http_sessions = threading.local()
 
 
 def banner():
@@ -79,130 +167,214 @@ def banner():
     print('          Recommend the Bitquark 100000 Wordlist in the Wordlist Directory    \n' + Style.RESET_ALL)
     print("-" * 79)
 
-def main():
-    try:
-        domain = args.domain
-    except IndexError:
-        print(
-            fail + f'\n[warn] You did not enter a domain. Syntax is python3 msdnsscan.py <domain>.')
-        quit()
+async def resolve_many(queries):
+    # All (name, rdtype) lookups run at once through the shared DNS cache and
+    # share one lookup_budget deadline; each query maps to its answer texts
+    # or the exception it raised
+    lookup = resolver_query(lifetime=lookup_budget)
+    tasks = {asyncio.ensure_future(dns_cache.aresolve(name, rdtype, query=lookup)): (name, rdtype)
+             for name, rdtype in queries}
+    done, pending = await asyncio.wait(tasks, timeout=lookup_budget)
+    for task in pending:
+        task.cancel()
+    results = {}
+    for task, query in tasks.items():
+        if task not in done:
+            results[query] = dns.exception.Timeout()
+        elif task.exception() is not None:
+            results[query] = task.exception()
+        elif task.result()['rcode'] == 'NXDOMAIN':
+            results[query] = dns.resolver.NXDOMAIN()
+        elif not task.result()['answers']:
+            results[query] = dns.resolver.NoAnswer()
+        else:
+            results[query] = task.result()['answers']
+    return results
+
+@lru_cache(maxsize=None)
+def load_selectors(path):
+    with open(path) as f:
+        return tuple(line.strip() for line in f if line.strip() and not line.startswith('#'))
+
+@lru_cache(maxsize=None)
+def spf_expander():
+    # One expander per run, so shared includes are only expanded once
+    return SpfExpander(dns_cache, resolver_query(lifetime=lookup_budget))
+
+@lru_cache(maxsize=None)
+def word_stats():
+    return WordStats()
+
+def dkim_selectors():
+    selectors = list(load_selectors(selector_file))
+    if args.dkim_selectors is not None:
+        selectors.extend(load_selectors(args.dkim_selectors))
+    return list(dict.fromkeys(selectors))
+
+def main(domain=None):
+    domain = domain or args.domain
+    results = {}
+    answers_by_type = asyncio.run(resolve_many([(domain, records) for records in record_types]))
     for records in record_types:
-        try:
-            answers = dns.resolver.resolve(domain, records)
-            print(info + f'\n{records} Records')
-            print('-' * 50)
+        answers = answers_by_type[(domain, records)]
+        if isinstance(answers, dns.resolver.NXDOMAIN):
+            output(fail + f'\n[warn] {domain} domain does not exist.\n')
+            return None
+        elif isinstance(answers, dns.resolver.NoAnswer):
+            output(info + f'\n[info] No {records} records found.')
+        elif isinstance(answers, Exception):
+            pass
+        else:
+            output(info + f'\n{records} Records')
+            output('-' * 50)
+            results[records] = []
             for server in answers:
-                print(success + server.to_text())
+                output(success + server)
+                results[records].append(server)
+    return results
 
-        except dns.resolver.NXDOMAIN:
-            print(fail + f'\n[warn] {domain} domain does not exist.\n')
-            quit()
-        except dns.resolver.NoAnswer:
-            print(info + f'\n[info] No {records} records found.')
-        except dns.rdatatype.UnknownRdatatype:
-            pass
-        except dns.resolver.NoNameservers:
-            pass
-        except dns.resolver.NoAnswer:
-            pass
-        except Exception:
-            pass
 
+async def attempt_xfr(nameserver, ip_addr, domain):
+    zone = dns.zone.Zone(domain)
+    await dns.asyncquery.inbound_xfr(ip_addr, zone, timeout=xfr_deadline, lifetime=xfr_deadline)
+    return nameserver, ip_addr, zone
 
-def zone_transfer():
-    domain = args.domain
-    address = domain
-    try:
-        name_server = dns.resolver.resolve(address, 'NS')
-        print(
-            info + f'\nZone Transfer Records - This may take a minute')
-        print('-' * 50)
-        for server in name_server:
-            ip_value = dns.resolver.resolve(server.target, 'A')
-            for ip_addr in ip_value:
-                try:
-                    z_transfer = dns.zone.from_xfr(
-                        dns.query.xfr(str(ip_addr), address))
-                    print(
-                        info + f'\nZone transfer records for {server} at {ip_addr}')
-                    print('-' * 60)
-                    for z_host in z_transfer:
-                        print(success + z_host.to_text())
-                except dns.xfr.TransferError:
-                    print(info + f'\n[info] Zone Transfer refused for {server}')
-                    pass
-                except TimeoutError:
-                    print(info + f'\n[info] Zone Transfer refused for {server}')
-                    pass
-                except dns.resolver.NoAnswer:
-                    pass
-                except Exception:
-                    pass
-    except dns.resolver.NoAnswer:
-        pass
-def email():
-    domain = args.domain
+async def nameserver_addresses(domain):
+    # (nameserver, ip) for every IPv4 and IPv6 address of every NS
+    ns_answer = (await resolve_many([(domain, 'NS')]))[(domain, 'NS')]
+    if isinstance(ns_answer, Exception):
+        return []
+    nameservers = list(ns_answer)
+    addresses = await resolve_many([(server, rdtype) for server in nameservers for rdtype in ('A', 'AAAA')])
+    targets = []
+    for (server, rdtype), answer in addresses.items():
+        if not isinstance(answer, Exception):
+            targets.extend((server, ip_addr) for ip_addr in answer)
+    return targets
+
+async def parallel_xfr(domain):
+    # Try AXFR against every IPv4 and IPv6 address of every NS at once and
+    # cancel the rest as soon as one transfer completes
+    targets = await nameserver_addresses(domain)
+    tasks = {asyncio.ensure_future(asyncio.wait_for(attempt_xfr(server, ip_addr, domain), xfr_deadline)):
+             (server, ip_addr) for server, ip_addr in targets}
+    pending = set(tasks)
+    refused = []
+    transferred = None
+    while pending and transferred is None:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            if task.exception() is not None:
+                refused.append(tasks[task])
+            elif transferred is None:
+                transferred = task.result()
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+    return transferred, refused
+
+def zone_records(zone):
+    records = []
+    for name, ttl, rdata in zone.iterate_rdatas():
+        records.append({
+            'name': name.derelativize(zone.origin).to_text(),
+            'ttl': ttl,
+            'type': dns.rdatatype.to_text(rdata.rdtype),
+            'data': rdata.to_text()
+        })
+    return records
+
+def zone_transfer(domain=None):
+    domain = domain or args.domain
+    output(info + f'\nZone Transfer Records')
+    output('-' * 50)
+    transferred, refused = asyncio.run(parallel_xfr(domain))
+    for server, ip_addr in refused:
+        output(info + f'[info] Zone Transfer refused for {server} at {ip_addr}')
+    if transferred is None:
+        return None
+    server, ip_addr, zone = transferred
+    output(info + f'\nZone transfer records for {server} at {ip_addr}')
+    output('-' * 60)
+    transfer = {'nameserver': server, 'ip': ip_addr, 'records': zone_records(zone)}
+    for record in transfer['records']:
+        output(success + f"{record['name']} {record['ttl']} IN {record['type']} {record['data']}")
+    return transfer
+
+def email(domain=None):
+    domain = domain or args.domain
     address = domain
     dmarc_val = 0
     spf_val = 0
     dkim_val = 0
     records = []
-    print(info + f'\nEmail Records')
-    print('-' * 50)
-    try:
-        dmarc_data = dns.resolver.resolve(f'_dmarc.{address}', 'TXT')
+    results = {'dmarc': [], 'spf': [], 'dkim': []}
+    output(info + f'\nEmail Records')
+    output('-' * 50)
+    selectors = dkim_selectors()
+    queries = [(f'_dmarc.{address}', 'TXT'), (domain, 'TXT')]
+    queries += [(f'{selector}._domainkey.{domain}', 'TXT') for selector in selectors]
+    answers = asyncio.run(resolve_many(queries))
+
+    dmarc_data = answers[(f'_dmarc.{address}', 'TXT')]
+    if not isinstance(dmarc_data, Exception):
         for dmarc_response in dmarc_data:
             if 'DMARC1' in str(dmarc_response):
                 records.append(success + f'[dmarc record] {dmarc_response}')
+                results['dmarc'].append(str(dmarc_response))
                 dmarc_val += 1
-    except dns.resolver.NXDOMAIN:
-        pass
-    except dns.resolver.NoAnswer:
-        pass
-    try:
-        spf_data = dns.resolver.resolve(domain, 'TXT')
+    spf_data = answers[(domain, 'TXT')]
+    if not isinstance(spf_data, Exception):
         for spf_response in spf_data:
             if 'spf1' in str(spf_response):
                 records.append(success + f'[spf record] {spf_response}')
+                results['spf'].append(str(spf_response))
                 spf_val += 1
-    except dns.resolver.NXDOMAIN:
-        pass
-    except dns.resolver.Timeout:
-        pass
-    except dns.resolver.NoAnswer:
-        pass
-    selectors = ["2013-03", "a2hosting","20161025", "alfa", "beta", "cm", "default", "delta", "dkim", "google",
-        "k1", "k2", "k3", "k4", "k5", "m1", "m2", "m3", "m4", "m5", "mail", "mandrill", "my1",
-        "my2", "my3", "my4", "my5", "pf2014", "pm", "proddkim1024", "rit1608", "s1", "s1024",
-        "s2", "s2048", "s5", "s512", "s7", "s768", "selector1", "selector1-ebsmd-com0i",
-        "selector1-wwecorp-com", "selector2", "smtp", "smtpapi", "test", "zendesk", "zendesk1",
-        "ml", "consulenze"]
+    if spf_val:
+        expansion = asyncio.run(spf_expander().expand(domain))
+        results['spf_expanded'] = expansion
+        records.append(info + f"[spf lookups] {expansion['lookups']}/{LOOKUP_LIMIT} DNS lookups across "
+                       f"{len(expansion['includes'])} includes")
+        for network in expansion['networks']:
+            records.append(success + f'[spf network] {network}')
+        for term in expansion['unresolved']:
+            records.append(info + f'[spf unresolved] {term}')
+        for error in expansion['errors']:
+            records.append(fail + f'[spf error] {error}')
     for selector in selectors:
-        try:
-            dkim_data = dns.resolver.resolve(f'{selector}._domainkey.{domain}', 'TXT')
-            for dkim_response in dkim_data:
-                if 'DKIM1' in str(dkim_response):
-                    records.append(success + f'[dkim record] {dkim_response}')
-                    dkim_val += 1
-        except dns.resolver.NXDOMAIN:
-            pass
-        except dns.resolver.NoAnswer:
-            pass
-        except dns.resolver.Timeout:
-            pass
+        dkim_data = answers[(f'{selector}._domainkey.{domain}', 'TXT')]
+        if isinstance(dkim_data, Exception):
+            continue
+        for dkim_response in dkim_data:
+            if 'DKIM1' in str(dkim_response):
+                records.append(success + f'[dkim record] {dkim_response}')
+                results['dkim'].append({'selector': selector, 'record': str(dkim_response)})
+                dkim_val += 1
     for success_val in records:
-        print(success_val)
+        output(success_val)
     if dmarc_val == 0:    
-        print(info + f'[info] DMARC data not found for {domain}')
+        output(info + f'[info] DMARC data not found for {domain}')
     if spf_val == 0:
-        print(info + f'[info] SPF data not found for {domain}')
+        output(info + f'[info] SPF data not found for {domain}')
     if dkim_val == 0:
-        print(info + f'[info] DKIM data not found for {domain}')
+        output(info + f'[info] DKIM data not found for {domain}')
+    return results
+
+def http_session():
+    # One pooled session per HTTP worker thread
+    session = getattr(http_sessions, 'session', None)
+    if session is None:
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=32, pool_maxsize=32)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        http_sessions.session = session
+    return session
 
 def subdom_requestor(ip_addr, subdoms, domain):
     possible_headers = ['Server', 'X-Powered-By']
     server_headers = []
-    url_request = requests.get(f'\nhttps://{subdoms}.{domain}')
+    url_request = http_session().get(f'https://{subdoms}.{domain}', timeout=http_timeout)
     if url_request.status_code == 200:
         status_code = success + f'[{url_request.status_code}]'
         markdown_status_code = f'[{url_request.status_code}]'
@@ -219,7 +391,7 @@ def subdom_requestor(ip_addr, subdoms, domain):
         else:
             server_headers.append(server_header)
     if server_headers == None:
-        print(success + f'{subdoms}.{domain} - {ip_addr} - {status_code}')
+        output(success + f'{subdoms}.{domain} - {ip_addr} - {status_code}')
         if args.text == True:
             if str(ip_addr):
                 with open(f'{args.domain}_subdomains.txt', 'a') as sub_file:
@@ -233,7 +405,7 @@ def subdom_requestor(ip_addr, subdoms, domain):
                     md_file.write(f'### {markdown_status_code} - {print_header}\n')
     elif len(server_headers) == 1 and server_headers != 'None':
         print_header = server_header
-        print(
+        output(
         success + f'{subdoms}.{domain} - {ip_addr} - {status_code}' + servertype + f' [{server_headers[0]}]')
         if args.text == True:
             if str(ip_addr):
@@ -247,7 +419,7 @@ def subdom_requestor(ip_addr, subdoms, domain):
                         f'## {subdoms}.{domain} - {ip_addr}\n')
                     md_file.write(f'### {markdown_status_code}  - [{server_headers[0]}]\n')
     elif len(server_headers) == 2 and server_headers != 'None':
-        print(
+        output(
         success + f'{subdoms}.{domain} - {ip_addr} - {status_code}' + servertype + f' [{server_headers[0]}]/[{server_headers[1]}]')
         if args.text == True:
             if str(ip_addr):
@@ -262,98 +434,294 @@ def subdom_requestor(ip_addr, subdoms, domain):
                     md_file.write(f'### {markdown_status_code} - [{server_headers[0]}]/[{server_headers[1]}]\n')
     else:
         pass             
-    server_headers = []
+    return {'status_code': url_request.status_code, 'headers': server_headers}
 
-def try_statement(subdoms, domain, inscope_store):
+def probe_host(subdoms, domain, ip_values, inscope_store):
+    # One HTTP request per host, however many A records it has
+    if args.input is not None:
+        ip_values = inscope_store.filter(ip_values)
+    if not ip_values:
+        return None
+    record = {'subdomain': f'{subdoms}.{domain}', 'ip': list(ip_values), 'status_code': None, 'headers': []}
     try:
-        ip_value = dns.resolver.resolve(f'{subdoms}.{domain}', 'A')
-        for ip_addr in ip_value:
-            if args.input is not None:
-                for ip_check in inscope_store:
-                    if str(ip_addr) != str(ip_check):
-                        pass
-                    else:
-                        subdom_requestor(ip_addr, subdoms, domain)
-            elif args.input is None:
-                subdom_requestor(ip_addr, subdoms, domain)
-
-    except (requests.ConnectionError, dns.resolver.NXDOMAIN, dns.resolver.NoAnswer, 
-            dns.resolver.NoNameservers, dns.exception.Timeout, UnboundLocalError, 
-            requests.exceptions.TooManyRedirects):
+        record.update(subdom_requestor(', '.join(ip_values), subdoms, domain))
+    except (requests.RequestException, UnboundLocalError):
         pass
+    return record
+
+def load_resolver_pool():
+    if args.resolvers is not None:
+        trusted = read_resolver_file(args.trusted) if args.trusted else None
+        return ResolverPool.from_file(args.resolvers, trusted=trusted, timeout=query_timeout, retries=query_retries)
+    return ResolverPool.system(timeout=query_timeout, retries=query_retries)
+
+async def resolve_a(name, pool):
+    # (answers, CNAME chain) for name; empty when it does not exist or every resolver failed
+    try:
+        entry = await dns_cache.aresolve(name, 'A', query=pool.resolve)
+    except dns.exception.DNSException:
+        return [], []
+    return entry['answers'], entry['cnames']
+
+async def wildcard_answers(zone, pool):
+    # Random labels cannot exist, so whatever they resolve to is the wildcard
+    # answer set; the first CNAME hop is the wildcard record's own target
+    names = [f'{uuid.uuid4().hex[:16]}.{zone}' for _ in range(wildcard_probes)]
+    results = await asyncio.gather(*(resolve_a(name, pool) for name in names))
+    answers = {ip_addr for ip_values, _ in results for ip_addr in ip_values}
+    targets = {cnames[0] for _, cnames in results if cnames}
+    return answers, targets
 
-def process_subdomain(subdomains, domain, inscope_store):
+async def learn_wildcard(zone, pool):
+    answers, targets = await wildcard_answers(zone, pool)
+    if answers or targets:
+        found = ', '.join(sorted(targets) + sorted(answers))
+        output(info + f'[info] Wildcard DNS detected for *.{zone} - {found}. Matching answers are ignored.')
+    return {'answers': answers, 'targets': targets, 'reprobes': wildcard_reprobes, 'lock': asyncio.Lock()}
+
+async def is_wildcard(name, ip_values, cnames, pool, wildcards):
+    # Check the zone the name sits directly under, so words like "a.dev" are
+    # tested against *.dev.<domain> as well as the apex wildcard
+    zone = name.split('.', 1)[1]
+    if zone not in wildcards:
+        wildcards[zone] = asyncio.ensure_future(learn_wildcard(zone, pool))
+    wildcard = await wildcards[zone]
+    if not wildcard['answers'] and not wildcard['targets']:
+        return False
+
+    def matches():
+        if cnames and cnames[0] in wildcard['targets']:
+            return True
+        return set(ip_values) <= wildcard['answers']
+
+    if matches():
+        return True
+    # Wildcards onto rotating CDN or load balancer pools hand out addresses the
+    # first probes never saw, so an unfamiliar answer triggers another round
+    # of probes (a bounded number per zone) and the result is learned
+    async with wildcard['lock']:
+        if not matches() and wildcard['reprobes'] > 0:
+            wildcard['reprobes'] -= 1
+            answers, targets = await wildcard_answers(zone, pool)
+            wildcard['answers'] |= answers
+            wildcard['targets'] |= targets
+    return matches()
+
+async def brute_force(subdomains, domain, inscope_store, window, http_workers, on_result=None, learn=False):
+    pool = load_resolver_pool()
+    await pool.check_canaries()
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(maxsize=window * 2)
+    # Resolved hosts wait here for the HTTP stage, so a slow web server never
+    # holds up DNS workers
+    hits = asyncio.Queue(maxsize=10000)
+    http_pool = ThreadPoolExecutor(max_workers=http_workers)
+    wildcards = {}
+    # Only wordlist words feed the hit-rate table; permutations and walked
+    # labels come from this target and would skew rankings for every scan
+    stats = word_stats() if learn else None
+    wildcards[domain] = asyncio.ensure_future(learn_wildcard(domain, pool))
+    await wildcards[domain]
+
+    async def dns_worker():
+        while True:
+            subdoms = await queue.get()
+            if subdoms is None:
+                return
+            name = f'{subdoms}.{domain}'
+            ip_values, cnames = await resolve_a(name, pool)
+            progress['checked'] += 1
+            found = bool(ip_values) and not await is_wildcard(name, ip_values, cnames, pool, wildcards)
+            if stats:
+                stats.record(subdoms, hit=found)
+            if found:
+                progress['found'] += 1
+                await hits.put((subdoms, ip_values))
+
+    async def http_worker():
+        while True:
+            hit = await hits.get()
+            if hit is None:
+                return
+            subdoms, ip_values = hit
+            record = await loop.run_in_executor(http_pool, probe_host, subdoms, domain, ip_values, inscope_store)
+            if record:
+                results.append(record)
+                if on_result:
+                    on_result(record)
+
+    results = []
+    progress = {'checked': 0, 'found': 0}
+    started = time.monotonic()
+
+    async def report(interval):
+        while True:
+            await asyncio.sleep(interval)
+            elapsed = time.monotonic() - started
+            output(info + f'[info] {progress["checked"]} names checked ({progress["checked"] / elapsed:.0f}/s), {progress["found"]} found')
+
+    dns_workers = [asyncio.create_task(dns_worker()) for _ in range(window)]
+    http_tasks = [asyncio.create_task(http_worker()) for _ in range(http_workers)]
+    reporter = asyncio.create_task(report(float(args.progress))) if args.progress else None
+    try:
+        # The queue is bounded, so words are only pulled from the iterator as
+        # fast as the workers take them
+        for subdoms in subdomains:
+            await queue.put(subdoms)
+        for _ in dns_workers:
+            await queue.put(None)
+        await asyncio.gather(*dns_workers)
+        for _ in http_tasks:
+            await hits.put(None)
+        await asyncio.gather(*http_tasks)
+    finally:
+        if reporter:
+            reporter.cancel()
+        if stats:
+            stats.flush()
+        http_pool.shutdown(wait=False, cancel_futures=True)
+    if args.resolvers is not None:
+        summary = pool.summary()
+        output(info + f'\n[info] Resolver pool: {summary["healthy"]} healthy, {summary["disabled"]} disabled')
+    return results
+
+def process_subdomain(subdomains, domain, inscope_store, on_result=None, learn=False):
     if args.concurrent:
         concurrent_requests = int(args.concurrent)
     else:
-        concurrent_requests = 10
-    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrent_requests) as executor:
-        futures = []
-        try:
-            for subdoms in subdomains:
-                future = executor.submit(try_statement, subdoms, domain, inscope_store)
-                futures.append(future)
-
-            # Handles keyboard interrupts
-            for future in concurrent.futures.as_completed(futures):
-                try:
-                    future.result()
-                except KeyboardInterrupt:
-                    for task in futures:
-                        task.cancel()
-                    break
-        except KeyboardInterrupt:
-            for task in futures:
-                task.cancel()
-            raise
-
-def subdom_finder():
-    domain = args.domain
-    print(info + f'\n[info] Checking for subdomains. This may take some time depending on the wordlist.\n')
-    inscope_store = []
-    if args.input is not None:
-        lines = Path(args.input).read_text().splitlines()
-        for line in lines:
-            inscope_store.append(f'{line}')
+        concurrent_requests = 200
+    http_workers = int(args.http_concurrent) if args.http_concurrent else 20
+    return asyncio.run(brute_force(subdomains, domain, inscope_store, concurrent_requests, http_workers,
+                                   on_result=on_result, learn=learn))
+
+def read_wordlist(subdomain_list):
+    # Lazily yield words so multi-million line lists never sit in memory
+    for line in subdomain_list:
+        word = line.strip()
+        if word and not word.startswith('#'):
+            yield word
+
+def select_words(words):
+    # Order learned from past scans; both modes read the whole list before the first query
+    if args.top:
+        return word_stats().top(words, int(args.top))
+    if args.ranked:
+        return word_stats().rank(words)
+    return words
+
+def permute_found(results, domain, inscope_store, tried, on_result=None):
+    # Derive new candidates from what the brute force found and resolve the
+    # most likely ones first, skipping anything the wordlist already covered
+    budget = int(args.permute_budget) if args.permute_budget else 50000
+    known = [record['subdomain'][:-len(domain) - 1] for record in results]
+    output(info + f'\n[info] Trying up to {budget} permutations of {len(known)} found subdomains.\n')
+    candidates = islice(permutations(known, environments=load_environments(), seen=tried), budget)
+    return process_subdomain(candidates, domain, inscope_store, on_result)
+
+def load_scope():
+    if args.input is None:
+        return None
+    inscope_store = Scope.from_file(args.input)
+    for entry in inscope_store.invalid:
+        output(fail + f'[warn] Ignoring unrecognised scope entry: {entry}')
+    return inscope_store
+
+def subdom_finder(domain=None, on_result=None):
+    domain = domain or args.domain
+    output(info + f'\n[info] Checking for subdomains. This may take some time depending on the wordlist.\n')
+    inscope_store = load_scope()
+    # Grows with the wordlist, so multi-million line lists do not saturate it
+    tried = ScalableBloomFilter()
     
     if args.wordlist is not None:
-        with open(args.wordlist, 'r+') as subdomain_list:
+        with open(args.wordlist, 'r', errors='ignore') as subdomain_list:
             if args.markdown:
                 with open(f'{args.domain}_markdown.md', 'a') as md_file:
                     header_info = f'# {args.domain}\n'
                     md_file.write(header_info)
                     md_file.close()
-            subdomains = [line.strip() for line in subdomain_list]
-            process_subdomain(subdomains, domain, inscope_store)
+            words = remember(select_words(read_wordlist(subdomain_list)), tried)
+            results = process_subdomain(words, domain, inscope_store, on_result, learn=True)
     elif args.weblist is not None:
         url = args.weblist
         head, tail = os.path.split(url)
         urllib.request.urlretrieve(url, f'{tail}')
-        print(f'[info] Reading subdomains from {url}.\n')
+        output(f'[info] Reading subdomains from {url}.\n')
         subdom_file.append(tail)
-        with open(f'{tail}', 'r+') as subdomain_list:
+        with open(f'{tail}', 'r', errors='ignore') as subdomain_list:
             if args.markdown:
                 with open(f'{args.domain}_markdown.md', 'a') as md_file:
                     header_info = f'# {args.domain}\n'
                     md_file.write(header_info)
                     md_file.close()
-            subdomains = [line.strip() for line in subdomain_list]
-            process_subdomain(subdomains, domain, inscope_store)
+            words = remember(select_words(read_wordlist(subdomain_list)), tried)
+            results = process_subdomain(words, domain, inscope_store, on_result, learn=True)
         os.remove(f'{tail}')
     else:
-        process_subdomain(subdomain_array, domain, inscope_store)
+        results = process_subdomain(remember(select_words(subdomain_array), tried), domain, inscope_store, on_result,
+                                    learn=True)
+    if args.permute and results:
+        results += permute_found(results, domain, inscope_store, tried, on_result)
+    return results
+
+def crack_words():
+    # Candidate labels for NSEC3 cracking, streamed so large wordlists stay on disk
+    if args.wordlist is not None:
+        with open(args.wordlist, 'r', errors='ignore') as subdomain_list:
+            yield from read_wordlist(subdomain_list)
+    else:
+        yield from subdomain_array
+
+def walk(domain=None, on_result=None):
+    domain = domain or args.domain
+    output(info + f'\nZone Walk')
+    output('-' * 50)
+    servers = list(dict.fromkeys(ip_addr for _, ip_addr in asyncio.run(nameserver_addresses(domain))))
+    if not servers:
+        output(fail + f'[warn] No authoritative nameservers found for {domain}')
+        return []
+    denial, params = asyncio.run(zonewalk.detect(domain, servers))
+    if denial is None:
+        output(info + f'[info] {domain} does not use NSEC or NSEC3; it cannot be walked')
+        return []
+
+    if denial == 'nsec':
+        walked = asyncio.run(zonewalk.walk_nsec(domain, servers))
+        if walked['synthesized']:
+            output(info + f'[info] {domain} synthesizes NSEC answers on the fly, so only part of the zone is listed')
+        for name, types in sorted(walked['names'].items()):
+            output(success + f'{name}.{domain} {" ".join(types)}')
+        labels = list(walked['names'])
+    else:
+        salt = params['salt'].hex() or '-'
+        output(info + f'[info] NSEC3 zone (iterations {params["iterations"]}, salt {salt}), collecting hashes')
+        chain, hashes = asyncio.run(zonewalk.collect_nsec3(domain, servers, params))
+        complete = all(following in chain for following in chain.values())
+        output(info + f'[info] {len(hashes)} hashes collected' + (', chain complete' if complete else ''))
+        cracked = zonewalk.crack(hashes, domain, params, crack_words())
+        for digest, label in sorted(cracked.items(), key=lambda item: item[1]):
+            output(success + f'{label}.{domain} ({digest})')
+        output(info + f'[info] {len(cracked)} of {len(hashes)} hashes cracked')
+        labels = list(cracked.values())
+    output(info + f'\n[info] Resolving {len(labels)} names from the zone walk.\n')
+    return process_subdomain(labels, domain, load_scope(), on_result)
 
 def run():
     if args.dns:
-        main()
+        if main() is None:
+            quit()
     elif args.zone:
         zone_transfer()
     elif args.subdom:
         subdom_finder()
     elif args.email:
         email()
+    elif args.walk:
+        walk()
     elif args.all:
-        main(), email(), zone_transfer(), subdom_finder() 
+        if main() is None:
+            quit()
+        email(), zone_transfer(), subdom_finder()
     else:
         print(
             fail + f'\n[syntax error] Please include options. Ex - python3 msdnsscan.py -d example.com --dns.\n')
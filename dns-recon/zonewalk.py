@@ -0,0 +1,255 @@
+"""
+NSEC and NSEC3 zone walking for DNSSEC-signed zones.
+
+An NSEC chain names every owner in the zone, so following next-name
+pointers lists the whole zone with one query per name. Several walks start
+from different points of the namespace at once and each stops where another
+has already been. An NSEC3 chain only gives hashed owners: random names whose
+hash falls in a gap of the chain seen so far are queried until the chain
+closes, then the hashes are cracked offline against a wordlist across
+several processes.
+
+Usage:
+  import zonewalk
+  denial, params = await zonewalk.detect('example.com', servers)
+  walked = await zonewalk.walk_nsec('example.com', servers)
+  chain, hashes = await zonewalk.collect_nsec3('example.com', servers, params)
+  cracked = zonewalk.crack(hashes, 'example.com', params, words)
+"""
+import asyncio
+import base64
+import hashlib
+import os
+import random
+import string
+import uuid
+from bisect import bisect_right, insort
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import dns.asyncquery
+import dns.exception
+import dns.message
+import dns.name
+import dns.rcode
+import dns.rdatatype
+
+QUERY_TIMEOUT = 3.0
+# Walks start from the NSEC records covering these labels as well as the apex
+SEED_LABELS = string.digits + string.ascii_lowercase
+
+
+async def ask(servers, name, rdtype):
+    # DNSSEC-enabled query, trying each authoritative server until one answers
+    query = dns.message.make_query(name, rdtype, want_dnssec=True)
+    for server in random.sample(servers, len(servers)):
+        try:
+            response, _ = await dns.asyncquery.udp_with_fallback(query, server, timeout=QUERY_TIMEOUT)
+        except (dns.exception.DNSException, OSError):
+            continue
+        if response.rcode() in (dns.rcode.NOERROR, dns.rcode.NXDOMAIN):
+            return response
+    return None
+
+
+def nsec3_params(rdata):
+    return {'algorithm': rdata.algorithm, 'salt': rdata.salt, 'iterations': rdata.iterations}
+
+
+async def detect(domain, servers):
+    """Return ('nsec', None), ('nsec3', params) or (None, None) for an unsigned zone."""
+    response = await ask(servers, f'{uuid.uuid4().hex[:16]}.{domain}', 'A')
+    if response is None:
+        return None, None
+    for rrset in response.authority:
+        if rrset.rdtype == dns.rdatatype.NSEC:
+            return 'nsec', None
+        if rrset.rdtype == dns.rdatatype.NSEC3:
+            return 'nsec3', nsec3_params(rrset[0])
+    return None, None
+
+
+def nsec_owned_by(response, name):
+    for rrset in response.answer + response.authority:
+        if rrset.rdtype == dns.rdatatype.NSEC and rrset.name == name:
+            return rrset[0]
+    return None
+
+
+async def walk_nsec(domain, servers, max_queries=20000):
+    """Follow the NSEC chain; returns {'names': {relative name: [types]}, 'synthesized': bool}."""
+    apex = dns.name.from_text(domain)
+    names = {}
+    state = {'budget': max_queries, 'synthesized': False}
+
+    async def nsec_at(name):
+        response = await ask(servers, name, 'NSEC')
+        rdata = nsec_owned_by(response, name) if response else None
+        if rdata is None:
+            # Some servers refuse NSEC queries; a name just after this one is
+            # covered by the same record
+            response = await ask(servers, dns.name.Name((b'\x00',) + name.labels), 'A')
+            rdata = nsec_owned_by(response, name) if response else None
+        return rdata
+
+    async def walk(current):
+        while current not in names and state['budget'] > 0:
+            names[current] = []
+            state['budget'] -= 1
+            rdata = await nsec_at(current)
+            if rdata is None:
+                return
+            names[current] = rdata.to_text().split()[1:]
+            # Minimally covering ("black lies") answers invent \000.name successors
+            if rdata.next.labels[0] == b'\x00':
+                state['synthesized'] = True
+                return
+            if rdata.next == apex or not rdata.next.is_subdomain(apex):
+                return
+            current = rdata.next
+
+    async def seed(label):
+        response = await ask(servers, f'{label}.{domain}', 'A')
+        if response is None:
+            return []
+        if response.answer:
+            return [dns.name.from_text(f'{label}.{domain}')]
+        return [rrset.name for rrset in response.authority
+                if rrset.rdtype == dns.rdatatype.NSEC and rrset.name.is_subdomain(apex)]
+
+    starts = [apex]
+    for found in await asyncio.gather(*(seed(label) for label in SEED_LABELS)):
+        starts.extend(found)
+    await asyncio.gather(*(walk(start) for start in dict.fromkeys(starts)))
+    relative = {name.relativize(apex).to_text(): types for name, types in names.items()
+                if name != apex and types}
+    return {'names': relative, 'synthesized': state['synthesized']}
+
+
+def name_wire(domain):
+    return dns.name.from_text(domain).canonicalize().to_wire()
+
+
+def label_wire(label, apex_wire):
+    # Wire form of label.apex without building a dns.name; None if not a valid name
+    parts = label.lower().encode().split(b'.')
+    if not all(0 < len(part) < 64 for part in parts):
+        return None
+    return b''.join(bytes([len(part)]) + part for part in parts) + apex_wire
+
+
+def nsec3_digest(wire, salt, iterations):
+    # RFC 5155 section 5 (SHA-1 is the only defined algorithm)
+    digest = hashlib.sha1(wire + salt).digest()
+    for _ in range(iterations):
+        digest = hashlib.sha1(digest + salt).digest()
+    return base64.b32hexencode(digest).decode()
+
+
+async def collect_nsec3(domain, servers, params, window=20, max_queries=2000, max_attempts=20000):
+    """Gather the NSEC3 chain; returns ({owner hash: next hash}, all hashes seen)."""
+    apex_wire = name_wire(domain)
+    chain = {}
+    owners = []
+    state = {'budget': max_queries}
+
+    def covered(digest):
+        # Hashes are base32hex, which sorts in the same order as the raw digests
+        if not owners:
+            return False
+        owner = owners[bisect_right(owners, digest) - 1]
+        following = chain[owner]
+        if digest == owner:
+            return True
+        if owner < following:
+            return owner < digest < following
+        # Last record wraps round to the first hash
+        return digest > owner or digest < following
+
+    def complete():
+        return bool(chain) and all(following in chain for following in chain.values())
+
+    def gap_label():
+        for _ in range(max_attempts):
+            label = uuid.uuid4().hex[:12]
+            if not covered(nsec3_digest(label_wire(label, apex_wire), params['salt'], params['iterations'])):
+                return label
+        return None
+
+    async def probe():
+        while state['budget'] > 0 and not complete():
+            label = gap_label()
+            if label is None:
+                return
+            state['budget'] -= 1
+            response = await ask(servers, f'{label}.{domain}', 'A')
+            if response is None:
+                continue
+            for rrset in response.authority:
+                if rrset.rdtype != dns.rdatatype.NSEC3:
+                    continue
+                owner = rrset.name.labels[0].decode().upper()
+                if owner not in chain:
+                    insort(owners, owner)
+                chain[owner] = base64.b32hexencode(rrset[0].next).decode()
+
+    await asyncio.gather(*(probe() for _ in range(window)))
+    hashes = set(chain) | set(chain.values())
+    return chain, hashes
+
+
+_cracker = {}
+
+
+def init_cracker(apex_wire, salt, iterations, targets):
+    _cracker.update(apex_wire=apex_wire, salt=salt, iterations=iterations, targets=targets)
+
+
+def crack_chunk(labels):
+    found = []
+    for label in labels:
+        wire = label_wire(label, _cracker['apex_wire'])
+        if wire is None:
+            continue
+        digest = nsec3_digest(wire, _cracker['salt'], _cracker['iterations'])
+        if digest in _cracker['targets']:
+            found.append((digest, label))
+    return found
+
+
+def chunked(words, size):
+    chunk = []
+    for word in words:
+        chunk.append(word)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def crack(hashes, domain, params, words, workers=None, chunk_size=5000):
+    """Hash candidate labels across processes; returns {hash: label} for matches."""
+    apex_wire = name_wire(domain)
+    targets = frozenset(hashes) - {nsec3_digest(apex_wire, params['salt'], params['iterations'])}
+    cracked = {}
+    if not targets:
+        return cracked
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_cracker,
+                             initargs=(apex_wire, params['salt'], params['iterations'], targets)) as pool:
+        pending = set()
+
+        def collect(done):
+            for future in done:
+                cracked.update(future.result())
+
+        # Only a few chunks are queued per worker, so the wordlist is streamed
+        for chunk in chunked(words, chunk_size):
+            if len(cracked) == len(targets):
+                break
+            if len(pending) >= workers * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+            pending.add(pool.submit(crack_chunk, chunk))
+        collect(wait(pending).done)
+    return cracked
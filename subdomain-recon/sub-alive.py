@@ -1,11 +1,33 @@
+import argparse
+import asyncio
+import queue
 import subprocess
 import json
 import os
 import re
 import sys
-from datetime import datetime
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
 from urllib.parse import urlparse
 
+import dns.asyncresolver
+import dns.exception
+import dns.resolver
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.dnscache import DnsCache, resolver_query
+from common.probe import probe_urls
+from common.resolvers import ResolverPool
+from common.takeover import check_takeovers
+from common.whoiscache import WhoisCache
+
 # ========== UTILITIES ===========
 
 def extract_domain(input_url):
@@ -46,98 +68,484 @@ def fetch_whois(domain):
     except Exception as e:
         return {'error': str(e)}
 
+whois_cache = WhoisCache()
+
+
+def lookup_whois(domain):
+    return whois_cache.lookup(domain, fetch_whois)
+
 # ========== SUBDOMAIN ENUM & ENRICHMENT ===========
 
-def fetch_subdomains(domain):
+def stream_subdomains(domain, timeout=60):
+    # Yield names as subfinder prints them instead of waiting for it to exit
     try:
-        res = subprocess.run(['./subfinder', '-d', domain, '-silent'], capture_output=True, text=True, timeout=60)
-        return [d.strip() for d in res.stdout.splitlines() if d.strip()]
+        proc = subprocess.Popen(['./subfinder', '-d', domain, '-silent'], stdout=subprocess.PIPE,
+                                stderr=subprocess.DEVNULL, text=True, bufsize=1)
     except Exception as e:
         print(f"[!] subfinder error: {e}")
-        return []
+        return
+    expired = threading.Event()
+
+    def expire():
+        expired.set()
+        proc.kill()
+
+    timer = threading.Timer(timeout, expire)
+    timer.daemon = True
+    timer.start()
+    try:
+        for line in proc.stdout:
+            name = line.strip()
+            if name:
+                yield name
+    finally:
+        timer.cancel()
+        if proc.poll() is None:
+            proc.kill()
+        proc.wait()
+        if expired.is_set():
+            print(f"[!] subfinder for {domain} stopped after {timeout}s; enumeration may be incomplete")
+
+
+def fetch_subdomains(domain, timeout=60):
+    return list(dict.fromkeys(stream_subdomains(domain, timeout=timeout)))
+
+
+def produce_subdomains(domain, names, timeout=60):
+    seen = set()
+    try:
+        for name in stream_subdomains(domain, timeout=timeout):
+            if name not in seen:
+                seen.add(name)
+                names.put(name)
+    finally:
+        names.put(None)
+
+
+def iter_batches(names, batch_size=200, batch_wait=2.0):
+    # Hand out whatever arrived within batch_wait seconds of the first name,
+    # so probing starts while subfinder is still running.
+    while True:
+        name = names.get()
+        if name is None:
+            return
+        batch = [name]
+        deadline = time.monotonic() + batch_wait
+        while len(batch) < batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                name = names.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if name is None:
+                yield batch
+                return
+            batch.append(name)
+        yield batch
+
 
+# ========== DNS RESOLUTION ===========
 
-def enrich_subdomains(subdomains):
+dns_cache = DnsCache.shared()
+
+
+async def resolve_host(query, host, semaphore):
+    # Returns None for names that should not be probed over HTTP
+    async with semaphore:
+        lookups = (dns_cache.aresolve(host, 'A', query=query), dns_cache.aresolve(host, 'AAAA', query=query))
+        results = await asyncio.gather(*lookups, return_exceptions=True)
+    record = {'a': [], 'aaaa': [], 'cname': []}
+    timed_out = False
+    servfail = False
+    for rdtype, result in zip(('a', 'aaaa'), results):
+        if isinstance(result, dns.resolver.NXDOMAIN):
+            return None
+        if isinstance(result, dns.resolver.NoNameservers):
+            # Broken AAAA handling is common; only drop if A failed too
+            servfail = True
+            continue
+        if isinstance(result, (dns.exception.Timeout, dns.resolver.LifetimeTimeout)):
+            timed_out = True
+            continue
+        if isinstance(result, Exception):
+            continue
+        if result['rcode'] == 'NXDOMAIN':
+            return None
+        record[rdtype] = sorted(result['answers'])
+        for target in result['cnames']:
+            if target not in record['cname']:
+                record['cname'].append(target)
+    if not record['a'] and not record['aaaa'] and (servfail or not timed_out):
+        return None
+    return record
+
+
+def load_resolver_pool(path):
+    # Built once per run, so resolver health carries across batches and apexes
+    # and the canary check is only paid once
+    try:
+        pool = ResolverPool.from_file(path)
+    except (OSError, ValueError) as e:
+        print(f"[!] Cannot use --resolvers: {e}")
+        sys.exit(1)
+    asyncio.run(pool.check_canaries())
+    summary = pool.summary()
+    print(f"[+] Resolver pool: {summary['healthy']} healthy, {summary['disabled']} disabled by canary check")
+    return pool
+
+
+async def resolve_all(subdomains, concurrency=500, timeout=5, pool=None):
+    if pool:
+        query = pool.resolve
+    else:
+        resolver = dns.asyncresolver.Resolver()
+        resolver.lifetime = timeout
+        query = resolver_query(resolver)
+    semaphore = asyncio.Semaphore(concurrency)
+    records = await asyncio.gather(*(resolve_host(query, sub, semaphore) for sub in subdomains))
+    return dict(zip(subdomains, records))
+
+
+def resolve_subdomains(subdomains, concurrency=500, timeout=5, pool=None):
+    """Resolve A/AAAA for every name and drop those that cannot be probed.
+
+    Returns the surviving names, their A/AAAA/CNAME data and a map of
+    resolved IP -> names so later stages can dedupe shared hosts.
+    """
     if not subdomains:
-        return {}
-    # Create URLs with both HTTP and HTTPS schemes
-    urls = []
+        return [], {}, {}
+    try:
+        resolved = asyncio.run(resolve_all(subdomains, concurrency=concurrency, timeout=timeout, pool=pool))
+    except Exception as e:
+        print(f"[!] DNS resolution error: {e}")
+        return subdomains, {}, {}
+
+    alive = []
+    dns_data = {}
+    ip_groups = {}
     for sub in subdomains:
-        urls.append(f"http://{sub}")
-        urls.append(f"https://{sub}")
-    
-    cmd = [
-        './httpx',
-        '-json',
-        '-status-code',
-        '-tls-grab',
-        '-title',
-        '-content-length',
-        '-web-server',
-        '-cdn',
-        '-follow-redirects',
-        '-timeout', '30',
-        '-retries', '2',
-        '-no-color',
-        '-v'
-    ]
+        record = resolved.get(sub)
+        if record is None:
+            continue
+        alive.append(sub)
+        dns_data[sub] = record
+        for ip in record['a'] + record['aaaa']:
+            ip_groups.setdefault(ip, []).append(sub)
+    return alive, dns_data, ip_groups
+
+def find_takeovers(subdomains, concurrency=500, pool=None):
+    """Rank dangling-CNAME takeover candidates among all discovered names.
+
+    Runs over every name, not just the ones that resolve, because a CNAME
+    to a deleted resource is exactly what fails to resolve.
+    """
+    query = pool.resolve if pool else None
+    return asyncio.run(check_takeovers(subdomains, query=query, concurrency=concurrency))
+
+# ========== HTTP PROBING ===========
+
+HTTPX_CMD = [
+    './httpx',
+    '-json',
+    '-status-code',
+    '-tls-grab',
+    '-title',
+    '-content-length',
+    '-web-server',
+    '-cdn',
+    '-follow-redirects',
+    '-timeout', '30',
+    '-retries', '2',
+    '-no-color',
+    '-v'
+]
+
+
+def empty_record(url):
+    return {
+        'url': url,
+        'status_code': None,
+        'tls_version': None,
+        'content_length': None,
+        'title': None,
+        'server': None,
+        'cdn': None
+    }
+
+
+def parse_httpx_line(line):
     try:
-        proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-        stdout, stderr = proc.communicate(input='\n'.join(urls), timeout=300)
-        
-        enriched = {}
-        failed_urls = set()
-        
-        # Process stderr for failed connections
-        for line in stderr.splitlines():
-            if "Failed" in line and "Get" in line:
-                try:
-                    # Extract URL from the error message
-                    url = line.split("'")[1]
-                    failed_urls.add(url)
-                except:
-                    continue
-        
-        # Process stdout for successful responses
-        for line in stdout.splitlines():
+        item = json.loads(line)
+    except json.JSONDecodeError:
+        return None
+    url = item.get('url') or item.get('input')
+    if not url:
+        return None
+    tls = item.get('tls') or {}
+    tls_names = list(tls.get('subject_an') or [])
+    if tls.get('subject_cn'):
+        tls_names.append(tls['subject_cn'])
+    return {
+        'url': url,
+        'status_code': item.get('status_code'),
+        'tls_version': tls.get('tls_version'),
+        'content_length': item.get('content_length'),
+        'title': item.get('title'),
+        'server': item.get('webserver'),
+        'cdn': item.get('cdn_name'),
+        'final_url': item.get('final_url'),
+        'tls_names': tls_names
+    }
+
+
+def parse_failed_url(line):
+    # httpx -v reports unreachable targets as: Failed '<url>': Get ...
+    if "Failed" in line and "Get" in line:
+        try:
+            return line.split("'")[1]
+        except IndexError:
+            return None
+    return None
+
+
+def stream_httpx(urls, deadline=300, status=None):
+    """Feed urls into httpx incrementally and yield records as httpx prints them.
+
+    When the deadline passes httpx is killed, but every record it already
+    produced has been yielded, so callers keep partial results. If a status
+    dict is passed it is filled with 'ok', 'timed_out' and 'returncode'.
+    """
+    if status is None:
+        status = {}
+    status['timed_out'] = False
+    proc = subprocess.Popen(HTTPX_CMD, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                            stderr=subprocess.PIPE, text=True, bufsize=1)
+    failed_urls = set()
+    seen = set()
+
+    def feed():
+        try:
+            for url in urls:
+                proc.stdin.write(url + '\n')
+        except (BrokenPipeError, OSError, ValueError):
+            pass
+        finally:
             try:
-                item = json.loads(line)
-                url = item.get('url') or item.get('input')
-                if not url:
-                    continue
-                    
-                enriched[url] = {
-                    'url': url,
-                    'status_code': item.get('status_code'),
-                    'tls_version': item.get('tls', {}).get('tls_version'),
-                    'content_length': item.get('content_length'),
-                    'title': item.get('title'),
-                    'server': item.get('webserver'),
-                    'cdn': item.get('cdn_name')
-                }
-            except json.JSONDecodeError:
-                continue
-                
-        # Add failed URLs to enriched with null status
-        for url in failed_urls:
-            if url not in enriched:
-                enriched[url] = {
-                    'url': url,
-                    'status_code': None,
-                    'tls_version': None,
-                    'content_length': None,
-                    'title': None,
-                    'server': None,
-                    'cdn': None
-                }
-            
-    except Exception as e:
-        print(f"[!] httpx error: {e}")
+                proc.stdin.close()
+            except (BrokenPipeError, OSError):
+                pass
+
+    def drain_stderr():
+        for line in proc.stderr:
+            url = parse_failed_url(line)
+            if url:
+                failed_urls.add(url)
+
+    feeder = threading.Thread(target=feed, daemon=True)
+    stderr_reader = threading.Thread(target=drain_stderr, daemon=True)
+    feeder.start()
+    stderr_reader.start()
+    def expire():
+        status['timed_out'] = True
+        proc.kill()
+
+    timer = None
+    if deadline:
+        timer = threading.Timer(deadline, expire)
+        timer.daemon = True
+        timer.start()
+
+    try:
+        for line in proc.stdout:
+            record = parse_httpx_line(line)
+            if record:
+                seen.add(record['url'])
+                yield record
+    finally:
+        if timer:
+            timer.cancel()
+        if proc.poll() is None:
+            proc.kill()
+        proc.wait()
+        stderr_reader.join(timeout=5)
+        status['returncode'] = proc.returncode
+        status['ok'] = not status['timed_out'] and proc.returncode == 0
+
+    # Add failed URLs with null status
+    for url in failed_urls - seen:
+        yield empty_record(url)
+
+
+def default_workers():
+    # Each httpx process keeps its own pool of sockets, so bound the worker
+    # count by the fd limit as well as by the number of cores.
+    cpus = os.cpu_count() or 1
+    fd_limit = 1024
+    if resource is not None:
+        try:
+            fd_limit = resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+        except (ValueError, OSError):
+            pass
+    if fd_limit == getattr(resource, 'RLIM_INFINITY', -1):
+        fd_limit = 65536
+    return max(1, min(cpus * 2, fd_limit // 256))
+
+
+def probe_sharded(urls, collect, is_done, deadline=300, workers=None, shard_size=500, retries=1, slots=None):
+    workers = workers or default_workers()
+
+    def probe_shard(shard):
+        # slots is shared across apexes in batch mode and caps httpx processes globally
+        if slots:
+            slots.acquire()
+        try:
+            status = {}
+            for record in stream_httpx(shard, deadline=deadline, status=status):
+                collect(record)
+            return status.get('ok', False)
+        finally:
+            if slots:
+                slots.release()
+
+    pending = [urls[i:i + shard_size] for i in range(0, len(urls), shard_size)]
+    attempt = 0
+    while pending:
+        if attempt:
+            print(f"[+] Retrying {len(pending)} failed shards (attempt {attempt}/{retries})")
+        failed = []
+        pool = ThreadPoolExecutor(max_workers=min(workers, len(pending)))
+        try:
+            futures = {pool.submit(probe_shard, shard): shard for shard in pending}
+            for future in as_completed(futures):
+                shard = futures[future]
+                try:
+                    ok = future.result()
+                except Exception as e:
+                    print(f"[!] httpx shard error: {e}")
+                    ok = False
+                if not ok:
+                    # Only the URLs httpx never answered for need another pass
+                    remaining = [u for u in shard if not is_done(u)]
+                    if remaining:
+                        failed.append(remaining)
+        except KeyboardInterrupt:
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise
+        pool.shutdown()
+
+        attempt += 1
+        if attempt > retries:
+            if failed:
+                print(f"[!] {sum(len(s) for s in failed)} URLs left unprobed after {retries} retries")
+            break
+        pending = failed
+
+
+def enrich_subdomains(subdomains, sink=None, deadline=300, workers=None, shard_size=500, retries=1,
+                      engine='httpx', concurrency=200, per_host=4, scheme='both', schemes=None, slots=None,
+                      sink_lock=None):
+    if not subdomains:
         return {}
 
+    enriched = {}
+    # In batch mode every apex writes to the same sink, so the lock is shared
+    lock = sink_lock or threading.Lock()
+
+    def collect(record):
+        url = record['url']
+        with lock:
+            if url in enriched and record['status_code'] is None:
+                return
+            enriched[url] = record
+            if sink:
+                sink.write(json.dumps(record) + '\n')
+                sink.flush()
+
+    def is_done(url):
+        with lock:
+            return url in enriched
+
+    def probe(urls):
+        if engine == 'native':
+            probe_urls(urls, on_record=collect, concurrency=concurrency, per_host=per_host, retries=retries,
+                       slots=slots)
+        else:
+            probe_sharded(urls, collect, is_done, deadline=deadline, workers=workers,
+                          shard_size=shard_size, retries=retries, slots=slots)
+
+    try:
+        if scheme == 'smart':
+            enrich_smart(subdomains, probe, enriched, schemes)
+        else:
+            # Create URLs with both HTTP and HTTPS schemes
+            urls = []
+            for sub in subdomains:
+                urls.append(f"http://{sub}")
+                urls.append(f"https://{sub}")
+            probe(urls)
+    except KeyboardInterrupt:
+        print(f"[!] Probing interrupted, keeping {len(enriched)} results")
+
     return enriched
 
 
+def enrich_smart(subdomains, probe, enriched, schemes=None):
+    # https first; plain http only for hosts where TLS did not answer.
+    if schemes is None:
+        schemes = {}
+    probe([f"https://{sub}" for sub in subdomains])
+
+    fallback = []
+    for sub in subdomains:
+        record = enriched.get(f"https://{sub}")
+        if record and record['status_code'] is not None:
+            schemes[sub] = live_schemes('https', record, sub)
+        else:
+            fallback.append(sub)
+    if not fallback:
+        return schemes
+
+    print(f"[+] {len(fallback)} hosts did not answer over https, falling back to http")
+    probe([f"http://{sub}" for sub in fallback])
+    for sub in fallback:
+        record = enriched.get(f"http://{sub}")
+        if record is None:
+            continue
+        # Keep a single record per host: the http answer replaces the failed https one
+        enriched.pop(f"https://{sub}", None)
+        if record['status_code'] is not None:
+            schemes[sub] = live_schemes('http', record, sub)
+    return schemes
+
+
+def live_schemes(scheme, record, host):
+    # The probe already followed redirects, so a cross-scheme redirect to the
+    # same host tells us the other scheme answers too without sending another
+    # request for it. A redirect elsewhere says nothing about this host.
+    found = {scheme}
+    final_url = urlparse(record.get('final_url') or '')
+    if final_url.scheme and final_url.hostname == host.lower():
+        found.add(final_url.scheme)
+    return sorted(found)
+
+
+def harvest_tls_names(enriched, base, seen):
+    # SAN/CN names from certificates httpx already grabbed, limited to the
+    # target's namespace and to names not enumerated or harvested before
+    found = []
+    for record in enriched.values():
+        for name in record.get('tls_names') or []:
+            name = name.strip().lower().rstrip('.')
+            if name.startswith('*.'):
+                name = name[2:]
+            if (name == base or name.endswith('.' + base)) and name not in seen:
+                seen.add(name)
+                found.append(name)
+    return found
+
+
 def merge_data(subdomains, enriched):
     alive = []
     dead = []
@@ -181,27 +589,251 @@ def merge_data(subdomains, enriched):
     
     return {'alive': alive, 'dead': dead, 'check': check}
 
+# ========== INCREMENTAL ===========
+
+RECORD_FIELDS = ['url', 'status_code', 'tls_version', 'content_length', 'title', 'server', 'cdn']
+DELTA_FIELDS = ['status_code', 'title', 'server', 'cdn']
+
+
+def url_host(url):
+    return url.split('://', 1)[1]
+
+
+def find_previous_scan(base):
+    prefix = f"{sanitize_filename(base)}_scan_"
+    candidates = sorted(f for f in os.listdir('.') if f.startswith(prefix) and f.endswith('.json'))
+    return candidates[-1] if candidates else None
+
+
+def load_previous_scan(path):
+    with open(path) as f:
+        previous = json.load(f)
+    records = {}
+    for bucket in ('alive', 'dead', 'check'):
+        for item in previous.get(bucket, []):
+            records[item['url']] = {k: item.get(k) for k in RECORD_FIELDS}
+
+    # Scans written before probed_at existed count as probed when the file was written
+    fallback = datetime.fromtimestamp(os.path.getmtime(path))
+    probed_at = previous.get('probed_at', {})
+    known_hosts = {}
+    for url in records:
+        host = url_host(url)
+        known_hosts[host] = datetime.fromisoformat(probed_at[host]) if host in probed_at else fallback
+    # Names pre-resolution dropped have no records but are just as known
+    for host, checked_at in previous.get('unresolved', {}).items():
+        known_hosts.setdefault(host, datetime.fromisoformat(checked_at))
+    return previous, records, known_hosts
+
+
+def plan_incremental(subs, known_hosts, ttl_hours=24, recheck=500):
+    # Probe every new name, plus up to `recheck` known names whose last probe is
+    # older than the TTL (oldest first). Everything else is carried forward.
+    cutoff = datetime.now() - timedelta(hours=ttl_hours)
+    new = [s for s in subs if s not in known_hosts]
+    expired = sorted((s for s in subs if s in known_hosts and known_hosts[s] < cutoff), key=known_hosts.get)
+    to_probe = new + expired[:recheck]
+    probe_set = set(to_probe)
+    carried = [s for s in subs if s in known_hosts and s not in probe_set]
+    return to_probe, carried, len(new)
+
+
+def diff_scans(before, after):
+    added = [{k: after[u].get(k) for k in RECORD_FIELDS} for u in after if u not in before]
+    removed = [before[u] for u in before if u not in after]
+    changed = []
+    for url in after:
+        if url not in before:
+            continue
+        changes = {}
+        for field in DELTA_FIELDS:
+            if before[url].get(field) != after[url].get(field):
+                changes[field] = {'before': before[url].get(field), 'after': after[url].get(field)}
+        if changes:
+            changed.append({'url': url, 'changes': changes})
+    return {'added': added, 'removed': removed, 'changed': changed}
+
 # ========== MAIN ===========
 
-def main():
-    if len(sys.argv) != 2:
-        print(f"Usage: python3 {os.path.basename(__file__)} <domain>")
-        sys.exit(1)
+def options():
+    parser = argparse.ArgumentParser(description='Subdomain enumeration and liveness check')
+    parser.add_argument('domain', nargs='?', help='Target domain or URL')
+    parser.add_argument('-l', '--list', help='File of apex domains (one per line) to scan as a batch')
+    parser.add_argument('--apex-workers', type=int, default=4,
+                        help='Batch: apex domains scanned at once; also caps concurrent subfinder runs (default: 4)')
+    parser.add_argument('--global-workers', type=int,
+                        help='Batch: httpx processes across all apexes (default: based on cores and fd limit)')
+    parser.add_argument('--global-concurrency', type=int, default=1000,
+                        help='Batch: native engine requests in flight across all apexes (default: 1000)')
+    parser.add_argument('--global-resolve-concurrency', type=int, default=1000,
+                        help='Batch: DNS lookups in flight across all apexes, including takeover checks; '
+                             'split evenly between --apex-workers (default: 1000)')
+    parser.add_argument('--pipeline', action='store_true',
+                        help='Probe subdomains in batches while subfinder is still running')
+    parser.add_argument('--batch-size', type=int, default=200,
+                        help='Pipeline: maximum subdomains handed to the prober at once (default: 200)')
+    parser.add_argument('--no-resolve', action='store_true',
+                        help='Skip the DNS pre-resolution stage and probe every enumerated name')
+    parser.add_argument('--resolve-concurrency', type=int, default=500,
+                        help='DNS lookups in flight during pre-resolution (default: 500)')
+    parser.add_argument('--resolvers', help='File of resolver IPs to use for pre-resolution instead of the system resolver')
+    parser.add_argument('--takeover', action='store_true',
+                        help='Follow CNAME chains of every enumerated name and rank subdomain takeover candidates')
+    parser.add_argument('--scheme', choices=['both', 'smart'], default='both',
+                        help='Probe http and https for every host, or https first with http only as a fallback (default: both)')
+    parser.add_argument('--engine', choices=['httpx', 'native'], default='httpx',
+                        help='Probe with the ./httpx binary or the in-process asyncio prober (default: httpx)')
+    parser.add_argument('--concurrency', type=int, default=200,
+                        help='Native engine: maximum requests in flight (default: 200)')
+    parser.add_argument('--per-host', type=int, default=4,
+                        help='Native engine: maximum connections per host (default: 4)')
+    parser.add_argument('--san-rounds', type=int, default=0,
+                        help='Rounds of feeding TLS certificate SAN/CN names back into probing (default: 0)')
+    parser.add_argument('--timeout', type=int, default=300,
+                        help='Deadline per httpx shard in seconds; results produced before it are kept (default: 300)')
+    parser.add_argument('--workers', type=int,
+                        help='Number of httpx processes to run at once (default: based on cores and fd limit)')
+    parser.add_argument('--shard-size', type=int, default=500,
+                        help='URLs per httpx shard (default: 500)')
+    parser.add_argument('--retries', type=int, default=1,
+                        help='Times to retry URLs from failed shards (default: 1)')
+    parser.add_argument('--jsonl', help='Append each httpx record to this JSONL file as it arrives')
+    parser.add_argument('--whois-ttl', type=float, default=168,
+                        help='Hours a cached WHOIS answer stays valid (default: 168)')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Only probe new subdomains and TTL-expired known ones, and write a delta against the previous scan')
+    parser.add_argument('--previous', help='Previous scan JSON to compare against (default: latest <domain>_scan_*.json)')
+    parser.add_argument('--ttl', type=float, default=24,
+                        help='Incremental: hours before a known subdomain is due for a re-probe (default: 24)')
+    parser.add_argument('--recheck', type=int, default=500,
+                        help='Incremental: maximum TTL-expired known subdomains to re-probe per run (default: 500)')
+    args = parser.parse_args()
+    if not args.domain and not args.list:
+        parser.error('a domain or --list is required')
+    return args
 
-    base = extract_domain(sys.argv[1].strip())
 
+def scan_domain(base, args, sink=None, slots=None, sink_lock=None, resolve_concurrency=None, pool=None):
+    resolve_concurrency = resolve_concurrency or args.resolve_concurrency
+    if pool is None and args.resolvers and (args.takeover or not args.no_resolve):
+        pool = load_resolver_pool(args.resolvers)
+    whois_pool = ThreadPoolExecutor(max_workers=1)
     print(f"[+] WHOIS lookup for: {base}")
-    whois_data = fetch_whois(base)
+    whois_future = whois_pool.submit(lookup_whois, base)
+
+    previous_path = None
+    previous = {}
+    previous_records = {}
+    known_hosts = {}
+    if args.incremental:
+        previous_path = args.previous or find_previous_scan(base)
+        if previous_path:
+            previous, previous_records, known_hosts = load_previous_scan(previous_path)
+            print(f"[+] Incremental scan against {previous_path}")
+        else:
+            print("[!] No previous scan found, running a full scan")
+
+    all_subs = []
+    enriched = {}
+    carried_records = {}
+    dns_data = {}
+    probed_at = {}
+    unresolved = {}
+    schemes = {}
+    recheck_budget = [args.recheck]
+    probe_opts = {
+        'deadline': args.timeout,
+        'workers': args.workers,
+        'shard_size': args.shard_size,
+        'retries': args.retries,
+        'engine': args.engine,
+        'concurrency': args.concurrency,
+        'per_host': args.per_host,
+        'scheme': args.scheme,
+        'slots': slots,
+        'sink_lock': sink_lock
+    }
+
+    def process_batch(subs):
+        all_subs.extend(subs)
+        if previous_path:
+            subs, carried, new_count = plan_incremental(subs, known_hosts, ttl_hours=args.ttl,
+                                                        recheck=recheck_budget[0])
+            recheck_budget[0] -= len(subs) - new_count
+            print(f"[+] {new_count} new, {len(subs) - new_count} due for re-probe, {len(carried)} carried forward")
+            carried_set = set(carried)
+            for url, record in previous_records.items():
+                if url_host(url) in carried_set:
+                    carried_records[url] = record
+            for host in carried:
+                checked_at = known_hosts[host].isoformat(timespec='seconds')
+                if host in previous.get('unresolved', {}):
+                    unresolved[host] = checked_at
+                    continue
+                probed_at[host] = checked_at
+                if host in previous.get('dns', {}):
+                    dns_data[host] = previous['dns'][host]
+
+        if not args.no_resolve:
+            checked = subs
+            subs, resolved, _ = resolve_subdomains(subs, concurrency=resolve_concurrency, pool=pool)
+            dns_data.update(resolved)
+            print(f"[+] {len(subs)} subdomains resolve")
+            # Saved so the next incremental run treats them as known, not new
+            checked_at = datetime.now().isoformat(timespec='seconds')
+            kept = set(subs)
+            for host in checked:
+                if host not in kept:
+                    unresolved[host] = checked_at
+
+        print(f"[+] Enriching {len(subs)} subdomains via {args.engine}...")
+        enriched.update(enrich_subdomains(subs, sink=sink, schemes=schemes, **probe_opts))
+        probe_time = datetime.now().isoformat(timespec='seconds')
+        for host in subs:
+            probed_at[host] = probe_time
 
     print(f"[+] Enumerating subdomains for: {base}")
-    subs = fetch_subdomains(base)
-    print(f"[+] {len(subs)} subdomains found")
+    if args.pipeline:
+        # Unbounded, so subfinder is never blocked on the pipe (and killed by
+        # its deadline) while the prober works; iter_batches bounds the handoff
+        names = queue.Queue()
+        producer = threading.Thread(target=produce_subdomains, args=(base, names), daemon=True)
+        producer.start()
+        for batch in iter_batches(names, batch_size=args.batch_size):
+            print(f"[+] {len(batch)} subdomains received from subfinder")
+            process_batch(batch)
+        producer.join()
+    else:
+        subs = fetch_subdomains(base)
+        print(f"[+] {len(subs)} subdomains found")
+        process_batch(subs)
+
+    seen = set(all_subs)
+    for san_round in range(1, args.san_rounds + 1):
+        names = harvest_tls_names(enriched, base, seen)
+        if not names:
+            break
+        print(f"[+] TLS round {san_round}: {len(names)} new subdomains from certificate names")
+        process_batch(names)
+
+    takeovers = None
+    if args.takeover:
+        print(f"[+] Following CNAME chains of {len(all_subs)} subdomains for takeover candidates...")
+        takeovers = find_takeovers(all_subs, concurrency=resolve_concurrency, pool=pool)
+        likely = sum(1 for candidate in takeovers if candidate['score'] >= 60)
+        print(f"[+] {len(takeovers)} CNAMEs to third-party services, {likely} likely takeovers")
+
+    whois_data = whois_future.result()
+    whois_pool.shutdown()
 
-    print("[+] Enriching subdomains via httpx...")
-    enriched = enrich_subdomains(subs)
+    enriched = {**carried_records, **enriched}
+    ip_groups = {}
+    for host, record in dns_data.items():
+        for ip in record['a'] + record['aaaa']:
+            ip_groups.setdefault(ip, []).append(host)
 
     print("[+] Merging results...")
-    sub_results = merge_data(subs, enriched)
+    sub_results = merge_data(all_subs, enriched)
 
     output = {
         'whois': whois_data,
@@ -209,12 +841,103 @@ def main():
         'dead': sub_results['dead'],
         'check': sub_results['check']
     }
+    if args.scheme == 'smart':
+        output['schemes'] = schemes
+    if dns_data:
+        output['dns'] = dns_data
+        output['ip_groups'] = ip_groups
+    output['probed_at'] = probed_at
+    if unresolved:
+        output['unresolved'] = unresolved
+    if takeovers is not None:
+        output['takeover'] = takeovers
 
-    fname = f"{sanitize_filename(base)}_scan_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    fname = f"{sanitize_filename(base)}_scan_{stamp}.json"
     with open(fname, 'w') as f:
         json.dump(output, f, indent=4)
     print(f"[✓] Saved output to {fname}")
+
+    if previous_path:
+        delta = diff_scans(previous_records, enriched)
+        delta['previous'] = previous_path
+        delta_name = f"{sanitize_filename(base)}_delta_{stamp}.json"
+        with open(delta_name, 'w') as f:
+            json.dump(delta, f, indent=4)
+        print(f"[✓] Saved delta to {delta_name}: {len(delta['added'])} added, "
+              f"{len(delta['removed'])} removed, {len(delta['changed'])} changed")
+
     print(f"[+] Found {len(sub_results['alive'])} alive endpoints, {len(sub_results['dead'])} dead endpoints, and {len(sub_results['check'])} endpoints to check")
+    return output
+
+
+def read_apex_list(path):
+    apexes = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                apexes.append(extract_domain(line))
+    return list(dict.fromkeys(apexes))
+
+
+def scan_batch(apexes, args, sink=None):
+    # One pool of apex jobs shares a single global probe limit; --workers and
+    # --concurrency still cap what any one apex may use.
+    if args.engine == 'native':
+        slots = threading.BoundedSemaphore(args.global_concurrency)
+    else:
+        slots = threading.BoundedSemaphore(args.global_workers or default_workers())
+    # Each apex resolves in its own event loop, so the global DNS budget is
+    # split evenly between the apex workers rather than shared dynamically
+    resolve_concurrency = max(1, min(args.resolve_concurrency, args.global_resolve_concurrency // args.apex_workers))
+    sink_lock = threading.Lock()
+    # One resolver pool for the whole batch, so every apex benefits from what
+    # the others learned about bad resolvers
+    pool = None
+    if args.resolvers and (args.takeover or not args.no_resolve):
+        pool = load_resolver_pool(args.resolvers)
+    # Warm the WHOIS cache in the background; per-apex lookups wait on it per key
+    threading.Thread(target=whois_cache.bulk_lookup, args=(apexes, fetch_whois), daemon=True).start()
+    combined_name = f"batch_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl"
+    lock = threading.Lock()
+
+    def run_apex(apex):
+        output = scan_domain(apex, args, sink=sink, slots=slots, sink_lock=sink_lock,
+                             resolve_concurrency=resolve_concurrency, pool=pool)
+        with lock, open(combined_name, 'a') as combined:
+            for bucket in ('alive', 'dead', 'check'):
+                for item in output[bucket]:
+                    combined.write(json.dumps({'apex': apex, 'bucket': bucket, **item}) + '\n')
+        return output
+
+    with ThreadPoolExecutor(max_workers=args.apex_workers) as pool:
+        futures = {pool.submit(run_apex, apex): apex for apex in apexes}
+        for future in as_completed(futures):
+            apex = futures[future]
+            try:
+                output = future.result()
+                print(f"[✓] {apex}: {len(output['alive'])} alive, {len(output['dead'])} dead, {len(output['check'])} to check")
+            except Exception as e:
+                print(f"[!] {apex}: scan failed: {e}")
+    print(f"[✓] Saved combined results to {combined_name}")
+
+
+def main():
+    args = options()
+    whois_cache.ttl = args.whois_ttl * 3600
+    if args.list:
+        apexes = read_apex_list(args.list)
+        print(f"[+] Batch scan of {len(apexes)} apex domains")
+        run = lambda sink=None: scan_batch(apexes, args, sink=sink)
+    else:
+        base = extract_domain(args.domain.strip())
+        run = lambda sink=None: scan_domain(base, args, sink=sink)
+    if args.jsonl:
+        with open(args.jsonl, 'a') as sink:
+            run(sink=sink)
+    else:
+        run()
 
 if __name__ == '__main__':
     main()